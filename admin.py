@@ -1,10 +1,17 @@
 import streamlit as st
-import sqlite3
-from datetime import datetime
+import time
 
+from bootstrap import bootstrap
+import analytics
+import cache
+from data import add_video, reset_user_progress, set_daily_target
+import export
+import instrumentation
+
+# Admin Panel
 def admin_panel():
     st.sidebar.header("Admin Panel")
-
+    
     # Add Video Section
     st.sidebar.subheader("Add New Video")
     title = st.sidebar.text_input("Title")
@@ -12,30 +19,115 @@ def admin_panel():
     url = st.sidebar.text_input("YouTube URL")
     tags = st.sidebar.text_input("Tags (comma separated)")
     add_button = st.sidebar.button("Add Video")
-
+    
     if add_button:
         if title and level and url:
-            conn = sqlite3.connect('german_videos.db')
-            c = conn.cursor()
-            c.execute("INSERT INTO videos (title, level, url, tags, added_date) VALUES (?, ?, ?, ?, ?)",
-                      (title, level, url, tags, datetime.now().date()))
-            conn.commit()
-            conn.close()
+            add_video(title, level, url, tags)
             st.sidebar.success("Video added successfully!")
         else:
             st.sidebar.error("Please fill in all fields.")
-
+    
     # Set Daily Target Section
     st.sidebar.subheader("Set Daily Target for Users")
     user_id = st.sidebar.number_input("User ID", min_value=1, value=1)
     target_minutes = st.sidebar.number_input("Daily Target (minutes)", min_value=1, value=30)
     set_target_button = st.sidebar.button("Set Target")
-
+    
     if set_target_button:
-        conn = sqlite3.connect('german_videos.db')
-        c = conn.cursor()
-        c.execute("INSERT INTO user_targets (user_id, target_minutes, set_date) VALUES (?, ?, ?)",
-                  (user_id, target_minutes, datetime.now().date()))
-        conn.commit()
-        conn.close()
+        set_daily_target(user_id, target_minutes)
         st.sidebar.success("Daily target set successfully!")
+    
+    # Reset Progress Section
+    st.sidebar.subheader("Reset User Progress")
+    reset_user_id = st.sidebar.number_input("User ID to Reset", min_value=1, value=1)
+    reset_button = st.sidebar.button("Reset Progress")
+    
+    if reset_button:
+        reset_user_progress(reset_user_id)
+        st.sidebar.success(f"Progress for User {reset_user_id} has been reset.")
+    
+    # Analytics Section
+    analytics_panel()
+    
+    # Export Section
+    export_panel()
+    
+    # Query Cache Section
+    st.sidebar.subheader("Query Cache")
+    st.sidebar.table([{"function": name, **counts} for name, counts in cache.stats().items()])
+    
+    # Performance Section
+    performance_panel()
+
+# Overview of the whole user base (aggregates refresh every few minutes)
+def analytics_panel():
+    st.sidebar.subheader("User Analytics")
+    st.sidebar.write("**Users per level**")
+    st.sidebar.bar_chart([{"level": level, "users": users} for level, users in analytics.level_distribution()],
+                         x="level", y="users")
+    activity = analytics.daily_activity()
+    st.sidebar.write("**Daily active users (last 30 days)**")
+    st.sidebar.line_chart([{"day": day, "users": users} for day, users, _ in activity], x="day", y="users")
+    st.sidebar.write("**Input hours per day (last 30 days)**")
+    st.sidebar.bar_chart([{"day": day, "hours": round(hours, 1)} for day, _, hours in activity], x="day", y="hours")
+    st.sidebar.write("**Most watched videos**")
+    st.sidebar.table([{"title": title, "level": level, "watches": watches}
+                      for title, level, watches in analytics.most_watched()])
+
+# Download a table as CSV, JSONL or Parquet; the export only runs when the button is clicked
+def export_panel():
+    st.sidebar.subheader("Export Data")
+    table = st.sidebar.selectbox("Table", sorted(export.TABLES), key="export-table")
+    fmt = st.sidebar.selectbox("Format", export.FORMATS, key="export-format")
+    user_id = None
+    if export.TABLES[table][1] is not None:
+        user_id = st.sidebar.number_input("User ID (0 for all users)", min_value=0, value=0, key="export-user") or None
+    start = st.sidebar.date_input("From", value=None, key="export-start")
+    end = st.sidebar.date_input("To", value=None, key="export-end")
+    st.sidebar.download_button("Download", data=lambda: export.export_bytes(table, fmt, user_id, start, end),
+                               file_name=f"{table}.{fmt}", mime="application/octet-stream", key="export-download")
+
+# Query and render timings recorded by the instrumentation layer
+def performance_panel():
+    st.sidebar.subheader("Performance")
+    enabled = st.sidebar.checkbox("Record query and render timings", value=instrumentation.ENABLED)
+    if enabled != instrumentation.ENABLED:
+        instrumentation.set_enabled(enabled)
+    if st.sidebar.button("Clear timings"):
+        instrumentation.reset()
+    if not enabled:
+        return
+    
+    st.sidebar.write("**Startup (once per server process)**")
+    st.sidebar.table([{"step": name, "ms": round(ms, 1)} for name, ms in bootstrap()["timings"].items()])
+    
+    reruns = instrumentation.recent_reruns()
+    if reruns:
+        st.sidebar.write(f"**Queries per rerun:** {sum(r['queries'] for r in reruns) / len(reruns):.1f} "
+                         f"(last {len(reruns)} reruns)")
+        st.sidebar.write("**Recent reruns**")
+        st.sidebar.table([{
+            "page": r["page"],
+            "total ms": round(r["total_ms"], 1),
+            "queries": r["queries"],
+            "query ms": round(r["query_ms"], 1),
+            "elements": r["elements"],
+            **{f"{name} ms": round(ms, 1) for name, ms in r["phases"].items()},
+        } for r in reruns[:10]])
+    slowest = instrumentation.slowest_queries()
+    if slowest:
+        st.sidebar.write("**Slowest queries**")
+        st.sidebar.table([{
+            "query": sql if len(sql) <= 80 else sql[:77] + "...",
+            "count": count,
+            "avg ms": round(total / count, 2),
+            "max ms": round(worst, 2),
+        } for sql, count, total, worst in slowest])
+    recent = instrumentation.recent_queries(10)
+    if recent:
+        st.sidebar.write("**Recent queries**")
+        st.sidebar.table([{
+            "query": sql if len(sql) <= 80 else sql[:77] + "...",
+            "ms": round(ms, 2),
+            "at": time.strftime("%H:%M:%S", time.localtime(at)),
+        } for sql, ms, at in recent])
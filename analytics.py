@@ -0,0 +1,47 @@
+from datetime import date, timedelta
+
+import cache
+import db
+from stats import LEARNER_LEVELS, LEVEL_HOURS
+
+# Cross-user aggregates for the admin panel. Each is one aggregate query over the
+# rollup tables, cached for ANALYTICS_TTL seconds rather than invalidated on every
+# write, since any user's progress would otherwise expire them constantly.
+ANALYTICS_TTL = 300
+
+# The learner level for a user_totals row, evaluated in SQL
+LEVEL_CASE = ("CASE " + " ".join(f"WHEN total_minutes >= {hours * 60} THEN {index}"
+                                 for index, hours in reversed(list(enumerate(LEVEL_HOURS))) if hours)
+              + " ELSE 0 END")
+
+
+# Users per learner level (users with any recorded progress), as [(level name, users)]
+@cache.cached(ttl=ANALYTICS_TTL)
+def level_distribution():
+    with db.read_connection() as conn:
+        counts = dict(conn.execute(f"SELECT {LEVEL_CASE} AS level, COUNT(*) FROM user_totals GROUP BY level"))
+    return [(level["level"], counts.get(index, 0)) for index, level in enumerate(LEARNER_LEVELS)]
+
+
+# Active users and input hours per day over the last `days` days, oldest first, as
+# [(day, active users, hours)]; days without activity are included with zeros
+@cache.cached(ttl=ANALYTICS_TTL)
+def daily_activity(days=30, today=None):
+    today = today or date.today()
+    start = today - timedelta(days=days - 1)
+    with db.read_connection() as conn:
+        rows = {day: (users, minutes / 60) for day, users, minutes in conn.execute(
+            '''SELECT day, COUNT(*), SUM(minutes) FROM user_daily_totals
+               WHERE day BETWEEN ? AND ? AND minutes > 0 GROUP BY day''',
+            (start.isoformat(), today.isoformat()))}
+    return [(day, *rows.get(day, (0, 0.0)))
+            for day in ((start + timedelta(days=offset)).isoformat() for offset in range(days))]
+
+
+# The most watched videos, as [(title, level, watches)]
+@cache.cached(ttl=ANALYTICS_TTL)
+def most_watched(limit=10):
+    with db.read_connection() as conn:
+        return conn.execute('''SELECT v.title, v.level, w.watches FROM video_watch_counts w
+                               JOIN videos v ON v.id = w.video_id
+                               WHERE w.watches > 0 ORDER BY w.watches DESC LIMIT ?''', (limit,)).fetchall()
@@ -0,0 +1,217 @@
+import argparse
+import json
+import os
+import random
+import time
+from datetime import date, timedelta
+
+import cache
+import db
+import migrations
+import rollups
+import tags
+from import_videos import LEVELS, UPSERT_VIDEO
+
+# Preset database sizes: (videos, users, days of history)
+SIZES = {
+    "small": (10_000, 100, 365),
+    "medium": (100_000, 1_000, 730),
+    "large": (1_000_000, 1_000, 1_095),
+}
+
+TAG_POOL = ["news", "story", "daily life", "travel", "food", "history", "music", "sport",
+            "science", "politics", "culture", "grammar", "podcast", "interview", "kids"]
+WORDS = ["Deutsch", "Alltag", "Reise", "Nachrichten", "Geschichte", "Essen", "Musik", "Familie",
+         "Arbeit", "Stadt", "Wetter", "Schule", "Freunde", "Urlaub", "Einkaufen", "Sport"]
+
+DEFAULT_ITERATIONS = 50
+PAGE_ITERATIONS = 10
+
+
+# Fill a fresh database with synthetic videos and years of per-user progress
+def generate(path, videos, users, days, seed=1):
+    rng = random.Random(seed)
+    db.configure(path)
+    migrations.migrate()
+    today = date.today()
+
+    batch = []
+    for i in range(videos):
+        title = " ".join(rng.sample(WORDS, 3)) + f" {i}"
+        video_tags = ", ".join(rng.sample(TAG_POOL, rng.randint(1, 3)))
+        added = (today - timedelta(days=rng.randrange(days))).isoformat()
+        batch.append((title, rng.choice(LEVELS), f"https://youtu.be/{i:011d}", video_tags, added))
+        if len(batch) == 10_000 or i == videos - 1:
+            with db.write_connection() as conn:
+                conn.executemany(UPSERT_VIDEO, batch)
+                tags.sync_tags(conn, [(row[2], row[3]) for row in batch])
+            batch = []
+
+    with db.write_connection() as conn:
+        conn.executemany("INSERT OR IGNORE INTO users (id, name, created_at) VALUES (?, ?, ?)",
+                         [(user_id, f"User {user_id}", today.isoformat()) for user_id in range(1, users + 1)])
+
+    # Each user practices on most days: a few watched videos plus an occasional manual entry
+    for user_id in range(1, users + 1):
+        activity = rng.uniform(0.3, 0.95)
+        rows = []
+        for offset in range(days):
+            if rng.random() > activity:
+                continue
+            day = (today - timedelta(days=offset)).isoformat()
+            for _ in range(rng.randint(1, 3)):
+                rows.append((user_id, rng.randint(1, videos), day, 10))
+            if rng.random() < 0.3:
+                rows.append((user_id, 0, day, rng.randint(5, 60)))
+        with db.write_connection() as conn:
+            conn.executemany("INSERT INTO user_progress (user_id, video_id, watched_date, duration) VALUES (?, ?, ?, ?)"
+                             " ON CONFLICT DO NOTHING", rows)
+            conn.execute("INSERT INTO user_targets (user_id, target_minutes, set_date) VALUES (?, ?, ?)",
+                         (user_id, rng.choice([15, 30, 45, 60]), today.isoformat()))
+    with db.write_connection() as conn:
+        rollups.rebuild_totals(conn)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+# Call fn repeatedly and return (p50, p95) in milliseconds. With cold=True the
+# query caches are cleared before every call so the database cost is measured.
+def measure(fn, iterations, cold=True):
+    samples = []
+    for _ in range(iterations):
+        if cold:
+            cache.clear_all()
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return percentile(samples, 0.50), percentile(samples, 0.95)
+
+
+# name -> zero-argument callable for every data function worth timing
+def data_benchmarks(user_id):
+    import analytics
+    import data
+    import stats
+
+    today = date.today()
+    first_page, _ = data.fetch_videos_page(None, data.PAGE_SIZE)
+    cursor = (first_page[-1][5], first_page[-1][0]) if first_page else None
+    return {
+        "fetch_videos_page": lambda: data.fetch_videos_page(None, data.PAGE_SIZE),
+        "fetch_videos_page_next": lambda: data.fetch_videos_page(cursor, data.PAGE_SIZE),
+        "fetch_videos_page_filtered": lambda: data.fetch_videos_page(None, data.PAGE_SIZE, "Beginner", "news"),
+        "search_videos": lambda: data.search_videos("alltag reise", 0, data.PAGE_SIZE),
+        "fetch_level_counts": data.fetch_level_counts,
+        "fetch_tag_counts": data.fetch_tag_counts,
+        "fetch_user_progress": lambda: data.fetch_user_progress(user_id),
+        "fetch_daily_target": lambda: data.fetch_daily_target(user_id),
+        "fetch_month_totals": lambda: data.fetch_month_totals(
+            user_id, today.replace(day=1).isoformat(), today.isoformat()),
+        "user_stats": lambda: stats.user_stats(user_id, today),
+        "recommended_videos": lambda: data.recommended_videos(user_id),
+        "level_distribution": analytics.level_distribution,
+        "daily_activity": analytics.daily_activity,
+        "most_watched": analytics.most_watched,
+    }
+
+
+# name -> zero-argument callable that reruns one page headlessly with AppTest. The
+# session is prepared (first run, page selected) up front so only the rerun a user
+# triggers by interacting with the page is timed.
+def page_benchmarks(path):
+    from streamlit.testing.v1 import AppTest
+
+    os.environ["GERMAN_VIDEOS_DB"] = path
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+    def prepare(page, page_file):
+        at = AppTest.from_file(script, default_timeout=60).run()
+        at.switch_page(page_file).run()
+
+        def rerun():
+            at.run()
+            if at.exception:
+                raise RuntimeError(f"{page} page raised: {at.exception[0].message}")
+        return rerun
+
+    return {"render_dashboard": prepare("Dashboard", "dashboard.py"),
+            "render_progress": prepare("Progress", "progress.py")}
+
+
+# Compare results with a stored baseline; returns the names that got slower than the threshold allows
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, (p50, p95) in results.items():
+        if name not in baseline:
+            continue
+        base_p95 = baseline[name][1]
+        ratio = p95 / base_p95 if base_p95 else 1.0
+        flag = "REGRESSION" if ratio > threshold else ""
+        print(f"  {name:32s} p95 {base_p95:9.2f} -> {p95:9.2f} ms  x{ratio:5.2f} {flag}")
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the data functions and page renders against a synthetic database.")
+    parser.add_argument("--size", choices=sorted(SIZES), default="small")
+    parser.add_argument("--videos", type=int, help="override the preset video count")
+    parser.add_argument("--users", type=int, help="override the preset user count")
+    parser.add_argument("--days", type=int, help="override the preset days of history")
+    parser.add_argument("--db", help="database file (default: bench_<size>.db, reused if it exists)")
+    parser.add_argument("--regenerate", action="store_true", help="rebuild the database even if it exists")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--warm", action="store_true", help="keep the query caches between calls")
+    parser.add_argument("--skip-pages", action="store_true", help="do not render pages with AppTest")
+    parser.add_argument("--baseline", help="JSON file of earlier results to compare against")
+    parser.add_argument("--save-baseline", help="write these results to a JSON file")
+    parser.add_argument("--threshold", type=float, default=1.25, help="p95 ratio counted as a regression")
+    args = parser.parse_args()
+
+    videos, users, days = SIZES[args.size]
+    videos, users, days = args.videos or videos, args.users or users, args.days or days
+    path = args.db or f"bench_{args.size}.db"
+    if args.regenerate or not os.path.exists(path):
+        if os.path.exists(path):
+            os.remove(path)
+        print(f"Generating {path}: {videos:,} videos, {users:,} users, {days:,} days ...")
+        started = time.perf_counter()
+        generate(path, videos, users, days)
+        print(f"  done in {time.perf_counter() - started:.1f}s")
+    db.configure(path)
+    migrations.migrate()
+
+    # Time the busiest user, the one the Progress page would struggle with most
+    with db.read_connection() as conn:
+        user_id = conn.execute("SELECT user_id FROM user_totals ORDER BY total_minutes DESC LIMIT 1").fetchone()[0]
+
+    results = {}
+    print(f"{'name':34s}{'p50 ms':>10s}{'p95 ms':>10s}")
+    for name, fn in data_benchmarks(user_id).items():
+        results[name] = measure(fn, args.iterations, cold=not args.warm)
+        print(f"{name:34s}{results[name][0]:10.2f}{results[name][1]:10.2f}")
+    if not args.skip_pages:
+        for name, fn in page_benchmarks(path).items():
+            results[name] = measure(fn, PAGE_ITERATIONS, cold=not args.warm)
+            print(f"{name:34s}{results[name][0]:10.2f}{results[name][1]:10.2f}")
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"Compared with {args.baseline}:")
+        if compare(results, baseline, args.threshold):
+            exit_code = 1
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.save_baseline}")
+    raise SystemExit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
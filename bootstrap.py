@@ -0,0 +1,52 @@
+import streamlit as st
+import os
+import time
+
+import db
+import migrations
+import writer
+
+STYLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "style.css")
+
+
+# One-time setup per server process: schema migrations, opening and warming the
+# pooled connections, starting the background writer and loading the stylesheet.
+# Streamlit keeps the result for the life of the process, so reruns skip all of it.
+@st.cache_resource(show_spinner=False)
+def bootstrap():
+    timings = {}
+
+    def step(name, fn):
+        started = time.perf_counter()
+        result = fn()
+        timings[name] = (time.perf_counter() - started) * 1000
+        return result
+
+    step("migrations", migrations.migrate)
+    step("connections", _warm_connections)
+    step("writer", writer.get_writer)
+    css = step("stylesheet", _load_css)
+    print("Startup: " + ", ".join(f"{name} {ms:.1f} ms" for name, ms in timings.items())
+          + f" (total {sum(timings.values()):.1f} ms, {db.DB_FILE})", flush=True)
+    return {"timings": timings, "css": css}
+
+
+# Open the write connection and one reader, and pull the hot tables' pages into the cache
+def _warm_connections():
+    with db.read_connection() as conn:
+        conn.execute("SELECT COUNT(*) FROM level_counts").fetchone()
+        conn.execute("SELECT id FROM videos ORDER BY added_date DESC LIMIT 50").fetchall()
+
+
+def _load_css():
+    with open(STYLE_FILE, encoding="utf-8") as f:
+        return f"<style>\n{f.read()}</style>"
+
+
+# Per-rerun entry point: runs the one-time setup on first use, then only emits the
+# already-loaded stylesheet as a single element (Streamlit removes elements that a
+# rerun does not emit again, so the <style> tag has to be sent on every rerun)
+def start_app():
+    app = bootstrap()
+    st.markdown(app["css"], unsafe_allow_html=True)
+    return app
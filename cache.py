@@ -0,0 +1,145 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+# Generation numbers per table and per (table, user_id). Writers bump them after
+# their transaction commits; cached readers compare the generations they were
+# computed under with the current ones and recompute when any of them moved.
+# The counters live in this process; for the tables registered with share(), the
+# generations the database keeps are polled as well, so writes made by another
+# process (a second server, the import CLI) invalidate the caches here too.
+_generations = {}
+_lock = threading.Lock()
+
+# How often (seconds) the shared generations are read from the database at most
+SHARED_POLL_INTERVAL = 1.0
+
+_shared_source = None
+_shared_seen = {}
+_shared_checked = 0.0
+_shared_lock = threading.Lock()
+
+# Every cache created by @cached, by function name
+_caches = {}
+
+
+# Mark a table (or one user's slice of it) as changed
+def bump(table, user_id=None):
+    key = table if user_id is None else (table, user_id)
+    with _lock:
+        _generations[key] = _generations.get(key, 0) + 1
+
+
+# Register a callable returning {table: generation} as kept in the database
+def share(read_generations):
+    global _shared_source
+    _shared_source = read_generations
+
+
+# Bump every shared table whose database generation moved since the last poll. One
+# thread polls at a time; the others carry on with the generations they have.
+def _poll_shared():
+    global _shared_checked
+    if _shared_source is None or time.monotonic() - _shared_checked < SHARED_POLL_INTERVAL:
+        return
+    if not _shared_lock.acquire(blocking=False):
+        return
+    try:
+        _shared_checked = time.monotonic()
+        for table, generation in _shared_source().items():
+            if _shared_seen.get(table) != generation:
+                _shared_seen[table] = generation
+                bump(table)
+    finally:
+        _shared_lock.release()
+
+
+def _snapshot(tables, user_id):
+    if user_id is None:
+        return tuple(_generations.get(table, 0) for table in tables)
+    return tuple((_generations.get(table, 0), _generations.get((table, user_id), 0)) for table in tables)
+
+
+class VersionedCache:
+    """Bounded LRU cache whose entries expire when their tables' generations change
+    (or, with a ttl, once they are ttl seconds old)."""
+
+    def __init__(self, name, tables, maxsize, user_scoped, ttl=None):
+        self.name = name
+        self.tables = tables
+        self.maxsize = maxsize
+        self.user_scoped = user_scoped
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        user_id = key[0][0] if self.user_scoped else None
+        if self.tables:
+            _poll_shared()
+        version = _snapshot(self.tables, user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version and (self.ttl is None or now - entry[2] < self.ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        # Compute outside the lock; the entry keeps the generations read before
+        # the query, so a write that lands meanwhile still invalidates it
+        value = compute()
+        with self._lock:
+            self._entries[key] = (version, value, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+        }
+
+
+# Cache a reader's results until one of the given tables is bumped. With
+# user_scoped=True the first argument is the user id and only bumps for that
+# user (or table-wide bumps) invalidate the entry. With ttl (seconds) entries
+# also expire with age; cached(ttl=...) without tables expires on age alone.
+def cached(*tables, maxsize=256, user_scoped=False, ttl=None):
+    def decorator(func):
+        cache = VersionedCache(func.__name__, tables, maxsize, user_scoped, ttl)
+        _caches[func.__name__] = cache
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            return cache.get(key, lambda: func(*args, **kwargs))
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+# Hit/miss counters for every cache, keyed by function name
+def stats():
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+
+def clear_all():
+    for cache in _caches.values():
+        cache.clear()
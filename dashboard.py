@@ -1,5 +1,79 @@
 import streamlit as st
-import sqlite3
+import re
+
+from data import (PAGE_SIZE, fetch_level_counts, fetch_tag_counts, fetch_videos_page,
+                  recommended_videos, search_videos)
+from session import current_user, mark_watched
+
+PAGE_SIZE_OPTIONS = sorted({6, 12, 24, 48, PAGE_SIZE})
+
+# Cards per row in the video grid
+GRID_COLUMNS = 3
+
+YOUTUBE_ID = re.compile(r"(?:v=|youtu\.be/|embed/|shorts/)([A-Za-z0-9_-]{11})")
+
+# Level and tag filters in the sidebar; returns (level, tag), None meaning no filter
+def filter_sidebar():
+    st.sidebar.subheader("Filter")
+    level_counts = fetch_level_counts()
+    level = st.sidebar.selectbox("Level", [None] + level_counts,
+                                 format_func=lambda o: "All levels" if o is None else f"{o[0]} ({o[1]:,})")
+    tag_counts = fetch_tag_counts()
+    tag = st.sidebar.selectbox("Tag", [None] + tag_counts,
+                               format_func=lambda o: "All tags" if o is None else f"{o[0]} ({o[1]:,})")
+    return (level[0] if level else None), (tag[0] if tag else None)
+
+# Thumbnail URL for a YouTube link, or None for other hosts
+def thumbnail_url(url):
+    match = YOUTUBE_ID.search(url or "")
+    return f"https://img.youtube.com/vi/{match.group(1)}/hqdefault.jpg" if match else None
+
+# One video card: a thumbnail placeholder until the user opens the player. key_prefix
+# keeps the widget keys apart when a video appears in more than one section.
+def video_card(video, key_prefix=""):
+    video_id, title, level, url, tags, added_date = video
+    open_videos = st.session_state.setdefault("open_videos", set())
+
+    st.subheader(title)
+    if video_id in open_videos:
+        st.video(url)
+        if st.button("Close player", key=f"{key_prefix}close-{video_id}"):
+            open_videos.discard(video_id)
+            st.rerun()
+    else:
+        thumbnail = thumbnail_url(url)
+        if thumbnail:
+            st.markdown(f'<img src="{thumbnail}" style="width:100%; border-radius:5px;">', unsafe_allow_html=True)
+        if st.button("▶ Play", key=f"{key_prefix}play-{video_id}"):
+            open_videos.add(video_id)
+            st.rerun()
+    st.write(f"**Level:** {level}")
+    st.write(f"**Tags:** {tags}")
+    st.write(f"**Added on:** {added_date}")
+    if st.button("Mark as Watched", key=f"{key_prefix}watch-{video_id}"):
+        recorded = mark_watched(video_id)  # Assuming 10 minutes per video
+        if recorded:
+            st.success("Video marked as watched!")
+        elif recorded is False:
+            st.info("Already marked as watched today.")
+
+# Videos in rows of GRID_COLUMNS cards
+def video_grid(videos, key_prefix=""):
+    for start in range(0, len(videos), GRID_COLUMNS):
+        for column, video in zip(st.columns(GRID_COLUMNS), videos[start:start + GRID_COLUMNS]):
+            with column:
+                video_card(video, key_prefix)
+
+# Previous/next controls; the cursor stack holds the start cursor of every page visited so far
+def pagination_controls(cursors, next_cursor, has_more):
+    prev_col, page_col, next_col = st.columns([1, 2, 1])
+    if prev_col.button("← Previous", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    page_col.write(f"Page {len(cursors)}")
+    if next_col.button("Next →", disabled=not has_more):
+        cursors.append(next_cursor)
+        st.rerun()
 
 def dashboard_page():
     # Page Title
@@ -7,6 +81,7 @@ def dashboard_page():
 
     # Search Section
     st.subheader("Search")
+    search = st.text_input("Search titles and tags", placeholder="e.g. nachrichten, alltag")
     col1, col2, col3, col4, col5 = st.columns(5)
     col1.button("Watch")
     col2.button("Series")
@@ -16,25 +91,45 @@ def dashboard_page():
 
     st.markdown("---")
 
-    # Fetch Videos from Database
-    conn = sqlite3.connect('german_videos.db')
-    c = conn.cursor()
-    videos = c.execute("SELECT * FROM videos").fetchall()
-    conn.close()
+    # Filters and page size; changing any of them or the search starts again from the first page
+    level, tag = filter_sidebar()
+    page_size = st.sidebar.selectbox("Videos per page", PAGE_SIZE_OPTIONS,
+                                     index=PAGE_SIZE_OPTIONS.index(PAGE_SIZE))
+    search = search.strip()
+    view = (page_size, search, level, tag)
+    if st.session_state.get("video_page_view") != view:
+        st.session_state["video_page_view"] = view
+        st.session_state["video_page_cursors"] = [None]
+    cursors = st.session_state.setdefault("video_page_cursors", [None])
+
+    # Fetch only the visible page: ranked search results (offset cursors) or the
+    # newest videos (keyset cursors)
+    if search:
+        offset = cursors[-1] or 0
+        videos, has_more = search_videos(search, offset, page_size, level, tag)
+        next_cursor = offset + len(videos)
+    else:
+        videos, has_more = fetch_videos_page(cursors[-1], page_size, level, tag)
+        next_cursor = (videos[-1][5], videos[-1][0]) if videos else None
+    if not videos:
+        st.write("No videos found.")
+        # Still offer the way back from a later page that came up empty
+        if len(cursors) > 1:
+            pagination_controls(cursors, next_cursor, False)
+        return
+
+    # Recommended for you: precomputed per user, on the unfiltered first page only
+    if not search and level is None and tag is None and len(cursors) == 1:
+        recommended = recommended_videos(current_user()["id"], GRID_COLUMNS)
+        if recommended:
+            st.subheader("Recommended for you")
+            video_grid(recommended, key_prefix="rec-")
+            st.markdown("---")
 
     # Display Videos
-    st.subheader(f"{len(videos)} videos found")
-    for video in videos:
-        st.subheader(video[1])  # Title
-        st.video(video[3])      # YouTube URL
-        st.write(f"**Level:** {video[2]}")  # Level
-        st.write(f"**Tags:** {video[4]}")   # Tags
-        st.write(f"**Added on:** {video[5]}")  # Added Date
-        if st.button(f"Mark as Watched - {video[1]}", key=video[0]):
-            conn = sqlite3.connect('german_videos.db')
-            c = conn.cursor()
-            c.execute("INSERT INTO user_progress (user_id, video_id, watched_date, duration) VALUES (?, ?, ?, ?)",
-                      (1, video[0], datetime.now().date(), 10))  # Assuming 10 minutes per video
-            conn.commit()
-            conn.close()
-            st.success("Video marked as watched!")
+    video_grid(videos)
+
+    pagination_controls(cursors, next_cursor, has_more)
+
+if __name__ == "__main__":
+    dashboard_page()
@@ -0,0 +1,221 @@
+from datetime import datetime
+import os
+import re
+import sqlite3
+
+import cache
+import db
+from import_videos import LEVELS, UPSERT_VIDEO
+import recommendations
+import rollups
+from tags import sync_tags
+import writer
+
+# Shared data layer: every page reads and writes through these functions. Readers are
+# cached per table (and per user where they take a user_id); writers bump the caches.
+
+# Videos shown per dashboard page (override with GERMAN_VIDEOS_PAGE_SIZE)
+PAGE_SIZE = int(os.environ.get("GERMAN_VIDEOS_PAGE_SIZE", "12"))
+
+# Most popular tags offered in the filter sidebar
+TAG_FACET_LIMIT = 50
+
+SEARCH_TOKEN = re.compile(r"\w+")
+
+# Generations of the shared tables as kept in the database (migration 13), so the
+# catalogue and user caches pick up writes made by other processes
+def _shared_generations():
+    with db.read_connection() as conn:
+        try:
+            return dict(conn.execute("SELECT name, generation FROM table_generations"))
+        except sqlite3.OperationalError:
+            return {}  # not migrated yet
+
+cache.share(_shared_generations)
+
+# Every user as (id, name), for the user picker
+@cache.cached("users")
+def fetch_users():
+    with db.read_connection() as conn:
+        return conn.execute("SELECT id, name FROM users ORDER BY name").fetchall()
+
+# Create a user and return their id; None if the name is taken (possibly by a user
+# created in another process that this process's user list does not show yet)
+def create_user(name):
+    with db.write_connection() as conn:
+        cursor = conn.execute("INSERT INTO users (name, created_at) VALUES (?, ?) ON CONFLICT (name) DO NOTHING",
+                              (name, datetime.now().isoformat(timespec="seconds")))
+    cache.bump("users")
+    return cursor.lastrowid if cursor.rowcount else None
+
+# A user's profile, version, lifetime and today's minutes and daily target in one query
+def fetch_user_context(user_id, today):
+    with db.read_connection() as conn:
+        row = conn.execute('''SELECT u.id, u.name, u.version, COALESCE(t.total_minutes, 0), COALESCE(d.minutes, 0),
+                                      (SELECT target_minutes FROM user_targets WHERE user_id = u.id
+                                       ORDER BY set_date DESC, id DESC LIMIT 1)
+                               FROM users u
+                               LEFT JOIN user_totals t ON t.user_id = u.id
+                               LEFT JOIN user_daily_totals d ON d.user_id = u.id AND d.day = ?
+                               WHERE u.id = ?''', (today, user_id)).fetchone()
+    if row is None:
+        return None
+    return {"id": row[0], "name": row[1], "version": row[2], "total_minutes": row[3],
+            "today_minutes": row[4], "target": row[5], "day": today}
+
+# A user's change version (bumped by every write to their totals or targets); deliberately
+# not cached, since it is how writes from other processes are noticed
+def fetch_user_version(user_id):
+    with db.read_connection() as conn:
+        row = conn.execute("SELECT version FROM users WHERE id = ?", (user_id,)).fetchone()
+    return row[0] if row else None
+
+# Add a new video to the database
+def add_video(title, level, url, tags):
+    with db.write_connection() as conn:
+        conn.execute(UPSERT_VIDEO, (title, level, url, tags, datetime.now().date()))
+        sync_tags(conn, [(url, tags)])
+    cache.bump("videos")
+
+# Fetch user progress from the database
+@cache.cached("user_progress", user_scoped=True)
+def fetch_user_progress(user_id):
+    with db.read_connection() as conn:
+        progress = conn.execute("SELECT total_minutes FROM user_totals WHERE user_id = ?",
+                                (user_id,)).fetchone()
+    return progress[0] if progress else 0
+
+# Fetch daily target from the database
+@cache.cached("user_targets", user_scoped=True)
+def fetch_daily_target(user_id):
+    with db.read_connection() as conn:
+        target = conn.execute("SELECT target_minutes FROM user_targets WHERE user_id = ? ORDER BY set_date DESC, id DESC LIMIT 1",
+                              (user_id,)).fetchone()
+    return target[0] if target else None
+
+# Set daily target for a user
+def set_daily_target(user_id, target_minutes):
+    with db.write_connection() as conn:
+        conn.execute("INSERT INTO user_targets (user_id, target_minutes, set_date) VALUES (?, ?, ?)",
+                     (user_id, target_minutes, datetime.now().date()))
+    cache.bump("user_targets", user_id)
+
+# Update minutes spent; queued for the background writer, returns a Future for the commit.
+# Resubmitting the same event_id (e.g. a button handler firing twice) records nothing.
+def update_minutes_spent(user_id, minutes_spent, event_id=None):
+    return writer.submit_progress(user_id, 0, datetime.now().date(), minutes_spent, event_id)
+
+# Reset user progress
+def reset_user_progress(user_id):
+    # Let queued progress land first so it cannot reappear after the reset
+    writer.get_writer().flush(writer.RESULT_TIMEOUT)
+    with db.write_connection() as conn:
+        conn.execute("DELETE FROM user_progress WHERE user_id = ?", (user_id,))
+        rollups.clear_user(conn, user_id)
+        recommendations.clear_user(conn, user_id)
+        conn.execute("DELETE FROM user_targets WHERE user_id = ?", (user_id,))
+    cache.bump("user_progress", user_id)
+    cache.bump("user_targets", user_id)
+    cache.bump("user_recommendations", user_id)
+
+# Record a watched video; queued for the background writer, returns a Future that
+# resolves to False if the video was already marked as watched today
+def mark_video_watched(user_id, video_id, minutes=10, event_id=None):
+    return writer.submit_progress(user_id, video_id, datetime.now().date(), minutes, event_id)
+
+# A user's precomputed recommendations, best first (one range read on the list's primary
+# key); None if the list has never been built for this user
+@cache.cached("user_recommendations", "videos", user_scoped=True)
+def fetch_recommendations(user_id):
+    with db.read_connection() as conn:
+        rows = conn.execute('''SELECT v.id, v.title, v.level, v.url, v.tags, v.added_date
+                               FROM user_recommendations r JOIN videos v ON v.id = r.video_id
+                               WHERE r.user_id = ? ORDER BY r.position''', (user_id,)).fetchall()
+        if not rows and conn.execute("SELECT 1 FROM user_recommendation_state WHERE user_id = ?",
+                                     (user_id,)).fetchone() is None:
+            return None
+    return rows
+
+# Build (or rebuild) a user's recommendations
+def refresh_recommendations(user_id):
+    recommendations.rebuild(user_id)
+    cache.bump("user_recommendations", user_id)
+
+# "Recommended for you" videos, built on the user's first visit and kept up to date by
+# the progress writer afterwards
+def recommended_videos(user_id, limit=None):
+    videos = fetch_recommendations(user_id)
+    if videos is None:
+        refresh_recommendations(user_id)
+        videos = fetch_recommendations(user_id)
+    return videos[:limit]
+
+# Minutes per day for one user between two ISO dates (inclusive), as {day: minutes}
+@cache.cached("user_progress", user_scoped=True)
+def fetch_month_totals(user_id, start, end):
+    with db.read_connection() as conn:
+        return dict(conn.execute("SELECT day, minutes FROM user_daily_totals WHERE user_id = ? AND day BETWEEN ? AND ?",
+                                 (user_id, start, end)))
+
+# Joins, WHERE conditions and parameters restricting videos v to a level and/or tag
+def _filters(level, tag):
+    joins, conditions, params = "", [], []
+    if tag is not None:
+        joins = " JOIN video_tags vt ON vt.video_id = v.id"
+        conditions.append("vt.tag_id = (SELECT id FROM tags WHERE name = ?)")
+        params.append(tag)
+    if level is not None:
+        conditions.append("v.level = ?")
+        params.append(level)
+    return joins, conditions, params
+
+# Fetch one page of videos, newest first, starting after an (added_date, id) cursor.
+# Returns the rows and whether another page follows.
+@cache.cached("videos")
+def fetch_videos_page(after=None, limit=PAGE_SIZE, level=None, tag=None):
+    joins, conditions, params = _filters(level, tag)
+    if after is not None:
+        conditions.append("(v.added_date, v.id) < (?, ?)")
+        params.extend(after)
+    query = "SELECT v.id, v.title, v.level, v.url, v.tags, v.added_date FROM videos v" + joins
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY v.added_date DESC, v.id DESC LIMIT ?"
+    with db.read_connection() as conn:
+        rows = conn.execute(query, params + [limit + 1]).fetchall()
+    return rows[:limit], len(rows) > limit
+
+# Turn free text into an FTS5 query: every word is matched as a prefix
+def fts_query(text):
+    return " ".join(f'"{token}"*' for token in SEARCH_TOKEN.findall(text))
+
+# Full-text search over titles and tags, best matches first (title hits weigh more).
+# Returns one page of rows starting at offset and whether another page follows.
+@cache.cached("videos")
+def search_videos(text, offset=0, limit=PAGE_SIZE, level=None, tag=None):
+    match = fts_query(text)
+    if not match:
+        return [], False
+    joins, conditions, params = _filters(level, tag)
+    query = ("SELECT v.id, v.title, v.level, v.url, v.tags, v.added_date"
+             " FROM videos_fts JOIN videos v ON v.id = videos_fts.rowid" + joins +
+             " WHERE " + " AND ".join(["videos_fts MATCH ?"] + conditions) +
+             " ORDER BY bm25(videos_fts, 10.0, 1.0) LIMIT ? OFFSET ?")
+    with db.read_connection() as conn:
+        rows = conn.execute(query, [match] + params + [limit + 1, offset]).fetchall()
+    return rows[:limit], len(rows) > limit
+
+# Video counts per level, in LEVELS order (read from the maintained level_counts table)
+@cache.cached("videos")
+def fetch_level_counts():
+    with db.read_connection() as conn:
+        counts = dict(conn.execute("SELECT level, video_count FROM level_counts WHERE video_count > 0"))
+    ordered = [level for level in LEVELS if level in counts] + sorted(set(counts) - set(LEVELS))
+    return [(level, counts[level]) for level in ordered]
+
+# The most used tags with their video counts (read from the maintained tags.video_count)
+@cache.cached("videos")
+def fetch_tag_counts(limit=TAG_FACET_LIMIT):
+    with db.read_connection() as conn:
+        return conn.execute("SELECT name, video_count FROM tags WHERE video_count > 0 ORDER BY video_count DESC, name LIMIT ?",
+                            (limit,)).fetchall()
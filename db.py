@@ -0,0 +1,168 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import instrumentation
+
+# Database file path (override with the GERMAN_VIDEOS_DB environment variable)
+DB_FILE = os.environ.get("GERMAN_VIDEOS_DB", "german_videos.db")
+
+# Number of read connections kept open per process
+READ_POOL_SIZE = int(os.environ.get("GERMAN_VIDEOS_READ_POOL", "4"))
+
+# How long a statement waits on a locked database before giving up
+BUSY_TIMEOUT_MS = 5000
+
+# Pragmas applied to every connection when it is opened. auto_vacuum only takes effect
+# on a new file (before journal_mode writes the header); older files are converted once
+# by maintenance.py.
+PRAGMAS = (
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=134217728",
+)
+
+
+# Open a connection with the shared pragmas applied
+def _connect(path, read_only=False):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                           check_same_thread=False, factory=instrumentation.connection_factory())
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    if read_only:
+        conn.execute("PRAGMA query_only=ON")
+    return conn
+
+
+class ConnectionPool:
+    """Long-lived connections to one database file.
+
+    Reads are served from a small pool of query-only connections. All writes
+    go through a single connection guarded by a lock, so writers queue up in
+    the process instead of fighting over SQLite's write lock.
+    """
+
+    def __init__(self, path, read_size=READ_POOL_SIZE):
+        self.path = path
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(read_size)
+        self._write_lock = threading.Lock()
+        self._writer = None
+        self._all = []
+        self._all_lock = threading.Lock()
+
+    def _track(self, conn):
+        with self._all_lock:
+            self._all.append(conn)
+        return conn
+
+    # Borrow a read connection, opening a new one if the pool is not full yet
+    @contextmanager
+    def reader(self):
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                # The writer creates the file and switches it to WAL first
+                self._writer_connection()
+                conn = self._track(_connect(self.path, read_only=True))
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def _writer_connection(self):
+        if self._writer is None:
+            with self._all_lock:
+                if self._writer is None:
+                    conn = _connect(self.path)
+                    self._all.append(conn)
+                    self._writer = conn
+        return self._writer
+
+    # Run a block inside one write transaction on the shared write connection. With
+    # transaction=False the block only holds the write lock, for statements such as
+    # VACUUM that cannot run inside a transaction.
+    @contextmanager
+    def writer(self, transaction=True):
+        with self._write_lock:
+            conn = self._writer_connection()
+            if not transaction:
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def close(self):
+        with self._all_lock:
+            for conn in self._all:
+                conn.close()
+            self._all = []
+            self._writer = None
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+# Return this process's pool, creating it on first use (and again after a fork)
+def get_pool():
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ConnectionPool(DB_FILE, READ_POOL_SIZE)
+                _pool_pid = os.getpid()
+    return _pool
+
+
+# Point the pool at a different database file, closing the old connections
+def configure(path):
+    global DB_FILE, _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = None
+        DB_FILE = path
+
+
+# Close every pooled connection in this process
+def close_all():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = None
+
+
+# Open fresh connections for new work; connections still in use finish on the old
+# pool and are closed once it is garbage collected
+def reset_pool():
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+
+def read_connection():
+    return get_pool().reader()
+
+
+def write_connection(transaction=True):
+    return get_pool().writer(transaction)
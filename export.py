@@ -0,0 +1,137 @@
+import argparse
+import csv
+import io
+import json
+import sys
+
+import db
+
+# Rows fetched from SQLite (and written) per step; memory use is bounded by this, not the table size
+CHUNK_SIZE = 5000
+
+FORMATS = ("csv", "jsonl", "parquet")
+
+# Exportable tables: columns as (name, type), and the columns the user and date filters apply to
+TABLES = {
+    "user_progress": ((("id", "int"), ("user_id", "int"), ("video_id", "int"), ("watched_date", "text"),
+                       ("duration", "int"), ("event_id", "text")), "user_id", "watched_date"),
+    "user_targets": ((("id", "int"), ("user_id", "int"), ("target_minutes", "int"), ("set_date", "text")),
+                     "user_id", "set_date"),
+    "videos": ((("id", "int"), ("title", "text"), ("level", "text"), ("url", "text"), ("tags", "text"),
+                ("added_date", "text")), None, "added_date"),
+}
+
+
+# SELECT and parameters for one table, filtered in SQL by user and inclusive date range
+def export_query(table, user_id=None, start=None, end=None):
+    columns, user_column, date_column = TABLES[table]
+    conditions, params = [], []
+    if user_id is not None:
+        if user_column is None:
+            raise ValueError(f"{table} cannot be filtered by user")
+        conditions.append(f"{user_column} = ?")
+        params.append(user_id)
+    if start is not None:
+        conditions.append(f"{date_column} >= ?")
+        params.append(str(start))
+    if end is not None:
+        conditions.append(f"{date_column} <= ?")
+        params.append(str(end))
+    query = f"SELECT {', '.join(name for name, _ in columns)} FROM {table}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return query + " ORDER BY id", params
+
+
+# Yield a query's rows CHUNK_SIZE at a time from one read snapshot
+def iter_chunks(query, params=(), chunk_size=CHUNK_SIZE):
+    with db.read_connection() as conn:
+        cursor = conn.execute(query, params)
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _write_csv(chunks, names, out):
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(names)
+    count = 0
+    for chunk in chunks:
+        writer.writerows(chunk)
+        count += len(chunk)
+    text.detach()
+    return count
+
+
+def _write_jsonl(chunks, names, out):
+    count = 0
+    for chunk in chunks:
+        out.write("".join(json.dumps(dict(zip(names, row)), ensure_ascii=False) + "\n"
+                          for row in chunk).encode("utf-8"))
+        count += len(chunk)
+    return count
+
+
+# One Parquet row group per chunk; needs the optional pyarrow package
+def _write_parquet(chunks, columns, out):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)") from None
+    types = {"int": pa.int64(), "text": pa.string()}
+    schema = pa.schema([(name, types[kind]) for name, kind in columns])
+    count = 0
+    with pq.ParquetWriter(out, schema) as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_arrays([pa.array(values, type=field.type)
+                                                     for values, field in zip(zip(*chunk), schema)], schema=schema))
+            count += len(chunk)
+    return count
+
+
+# Stream one table to a binary file object; returns the number of rows written
+def export(table, fmt, out, user_id=None, start=None, end=None):
+    columns = TABLES[table][0]
+    chunks = iter_chunks(*export_query(table, user_id, start, end))
+    if fmt == "csv":
+        return _write_csv(chunks, [name for name, _ in columns], out)
+    if fmt == "jsonl":
+        return _write_jsonl(chunks, [name for name, _ in columns], out)
+    if fmt == "parquet":
+        return _write_parquet(chunks, columns, out)
+    raise ValueError(f"unknown format {fmt!r}")
+
+
+# The whole export as bytes, for st.download_button
+def export_bytes(table, fmt, user_id=None, start=None, end=None):
+    out = io.BytesIO()
+    export(table, fmt, out, user_id, start, end)
+    return out.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export progress, targets or the video catalogue.")
+    parser.add_argument("table", choices=sorted(TABLES))
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--user-id", type=int, help="only this user's rows")
+    parser.add_argument("--start", help="first date to include (YYYY-MM-DD)")
+    parser.add_argument("--end", help="last date to include (YYYY-MM-DD)")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    args = parser.parse_args()
+    if args.user_id is not None and TABLES[args.table][1] is None:
+        parser.error(f"{args.table} cannot be filtered by user")
+
+    if args.output:
+        with open(args.output, "wb") as out:
+            count = export(args.table, args.format, out, args.user_id, args.start, args.end)
+    else:
+        count = export(args.table, args.format, sys.stdout.buffer, args.user_id, args.start, args.end)
+    print(f"Exported {count} {args.table} rows.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import argparse
+import csv
+import json
+import time
+from datetime import date, datetime
+
+import db
+import migrations
+import tags
+
+LEVELS = ["Superbeginner", "Beginner", "Intermediate", "Advanced"]
+
+# Rows per executemany call and executemany calls per transaction
+BATCH_SIZE = 1000
+BATCHES_PER_TRANSACTION = 20
+
+# Insert a video, or refresh title/level/tags of the existing row with the same URL
+UPSERT_VIDEO = '''INSERT INTO videos (title, level, url, tags, added_date) VALUES (?, ?, ?, ?, ?)
+                  ON CONFLICT (url) DO UPDATE SET title = excluded.title, level = excluded.level,
+                                                  tags = excluded.tags'''
+
+_LEVELS_BY_NAME = {level.lower(): level for level in LEVELS}
+
+
+# Yield (line number, dict) for every record in a CSV or JSONL file without loading it whole
+def read_records(path, fmt):
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, f"invalid JSON: {e.msg}"
+                    continue
+                yield line_no, record if isinstance(record, dict) else "expected a JSON object"
+
+
+# Turn a record into an UPSERT_VIDEO parameter tuple; returns (params, None) or (None, reason)
+def parse_record(record, today):
+    if isinstance(record, str):
+        return None, record
+    # JSON values may be numbers or booleans; compare and store them as text
+    title = str(record.get("title") or "").strip()
+    url = str(record.get("url") or "").strip()
+    level = _LEVELS_BY_NAME.get(str(record.get("level") or "").strip().lower())
+    tag_text = record.get("tags") or ""
+    tag_text = ", ".join(map(str, tag_text)) if isinstance(tag_text, list) else str(tag_text)
+    if not title:
+        return None, "missing title"
+    if not url:
+        return None, "missing url"
+    if level is None:
+        return None, f"unknown level {record.get('level')!r}"
+    added_date = record.get("added_date") or today
+    try:
+        # Stored as YYYY-MM-DD, since pagination orders by (added_date, id)
+        added_date = date.fromisoformat(str(added_date).strip()).isoformat()
+    except ValueError:
+        return None, f"invalid added_date {record.get('added_date')!r}"
+    return (title, level, url, tag_text.strip(), added_date), None
+
+
+# Stream a catalogue file into the videos table. Returns (rows processed, rejected
+# [(line, reason)], seconds elapsed); rows repeating a URL update the same video, so
+# the processed count can be higher than the number of videos added or changed.
+def import_videos(path, fmt=None, batch_size=BATCH_SIZE, batches_per_transaction=BATCHES_PER_TRANSACTION):
+    fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+    today = datetime.now().date().isoformat()
+    processed = 0
+    rejected = []
+    batches = []
+    batch = []
+    started = time.perf_counter()
+
+    def flush():
+        nonlocal processed
+        with db.write_connection() as conn:
+            for rows in batches:
+                conn.executemany(UPSERT_VIDEO, rows)
+                tags.sync_tags(conn, [(row[2], row[3]) for row in rows])
+                processed += len(rows)
+        batches.clear()
+
+    for line_no, record in read_records(path, fmt):
+        params, reason = parse_record(record, today)
+        if reason:
+            rejected.append((line_no, reason))
+            continue
+        batch.append(params)
+        if len(batch) >= batch_size:
+            batches.append(batch)
+            batch = []
+            if len(batches) >= batches_per_transaction:
+                flush()
+    if batch:
+        batches.append(batch)
+    if batches:
+        flush()
+    return processed, rejected, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import a video catalogue (CSV or JSONL with title, level, url, tags).")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--rejects", help="write rejected rows (line, reason) to this CSV file")
+    args = parser.parse_args()
+
+    migrations.migrate()
+    processed, rejected, elapsed = import_videos(args.path, args.format, args.batch_size)
+    rate = processed / elapsed if elapsed else 0
+    print(f"Processed {processed} rows in {elapsed:.2f}s ({rate:,.0f} rows/s), rejected {len(rejected)}.")
+    for line_no, reason in rejected[:20]:
+        print(f"  line {line_no}: {reason}")
+    if len(rejected) > 20:
+        print(f"  ... and {len(rejected) - 20} more")
+    if args.rejects:
+        with open(args.rejects, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["line", "reason"])
+            writer.writerows(rejected)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+# Off by default; turn on with GERMAN_VIDEOS_INSTRUMENT=1 or set_enabled(True) from the
+# admin panel. While off, connections are plain sqlite3 connections and the context
+# managers below return immediately, so the cost is one flag check per rerun.
+ENABLED = os.environ.get("GERMAN_VIDEOS_INSTRUMENT") == "1"
+
+# Ring buffer sizes for recent statements and recent reruns, and the number of distinct
+# statements aggregated (the least recently run ones are dropped beyond that)
+QUERY_LOG_SIZE = 1000
+RERUN_LOG_SIZE = 200
+STATEMENT_LOG_SIZE = 500
+
+_queries = deque(maxlen=QUERY_LOG_SIZE)
+_reruns = deque(maxlen=RERUN_LOG_SIZE)
+_statements = OrderedDict()
+_lock = threading.Lock()
+_local = threading.local()
+
+
+# Turn recording on or off; pooled connections are reopened so they pick up the change
+def set_enabled(flag):
+    global ENABLED
+    if flag != ENABLED:
+        ENABLED = flag
+        import db
+        db.reset_pool()
+
+
+def reset():
+    with _lock:
+        _queries.clear()
+        _reruns.clear()
+        _statements.clear()
+
+
+def _record(sql, elapsed):
+    sql = " ".join(sql.split())
+    entry = [sql, elapsed * 1000, time.time()]
+    with _lock:
+        _queries.append(entry)
+    rerun = getattr(_local, "rerun", None)
+    if rerun is not None:
+        rerun["queries"] += 1
+    return entry
+
+
+def _finish(entry):
+    sql, ms = entry[0], entry[1]
+    with _lock:
+        stats = _statements.setdefault(sql, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += ms
+        stats[2] = max(stats[2], ms)
+        _statements.move_to_end(sql)
+        while len(_statements) > STATEMENT_LOG_SIZE:
+            _statements.popitem(last=False)
+    rerun = getattr(_local, "rerun", None)
+    if rerun is not None:
+        rerun["query_ms"] += ms
+
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursor that times each statement, including the fetches that follow it."""
+
+    _entry = None
+
+    def _close_entry(self):
+        if self._entry is not None:
+            _finish(self._entry)
+            self._entry = None
+
+    def execute(self, sql, parameters=()):
+        self._close_entry()
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._entry = _record(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._close_entry()
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._entry = _record(sql, time.perf_counter() - started)
+
+    def _timed_fetch(self, fetch, *args):
+        started = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            if self._entry is not None:
+                self._entry[1] += (time.perf_counter() - started) * 1000
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, size or self.arraysize)
+
+    def fetchall(self):
+        result = self._timed_fetch(super().fetchall)
+        self._close_entry()
+        return result
+
+    def __next__(self):
+        try:
+            return self._timed_fetch(super().__next__)
+        except StopIteration:
+            self._close_entry()
+            raise
+
+    def __del__(self):
+        self._close_entry()
+
+
+class TracedConnection(sqlite3.Connection):
+    """Connection whose cursors (including the ones behind conn.execute) are traced."""
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+# Connection class for db._connect to use
+def connection_factory():
+    return TracedConnection if ENABLED else sqlite3.Connection
+
+
+# Record one Streamlit rerun: total time, time per phase, statements executed on this
+# thread and the number of elements sent to the browser
+@contextmanager
+def rerun(page=None):
+    if not ENABLED:
+        yield
+        return
+    record = {"page": page, "at": time.time(), "total_ms": 0.0, "phases": {},
+              "queries": 0, "query_ms": 0.0, "elements": None}
+    ctx = _script_run_ctx()
+    if ctx is not None:
+        record["elements"] = 0
+        send = ctx.enqueue
+
+        def counting_enqueue(msg):
+            if msg.WhichOneof("type") == "delta":
+                record["elements"] += 1
+            send(msg)
+        ctx.enqueue = counting_enqueue
+    _local.rerun = record
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record["total_ms"] = (time.perf_counter() - started) * 1000
+        _local.rerun = None
+        if ctx is not None:
+            del ctx.enqueue
+        with _lock:
+            _reruns.append(record)
+
+
+# Label the current rerun with the page it ended up rendering
+def set_page(page):
+    record = getattr(_local, "rerun", None)
+    if record is not None:
+        record["page"] = page
+
+
+# Time one phase (e.g. "migrate", "page") of the current rerun
+@contextmanager
+def phase(name):
+    record = getattr(_local, "rerun", None) if ENABLED else None
+    if record is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record["phases"][name] = record["phases"].get(name, 0.0) + (time.perf_counter() - started) * 1000
+
+
+def _script_run_ctx():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return None
+    return get_script_run_ctx(suppress_warning=True)
+
+
+# Statements by worst single run: (sql, count, total ms, max ms)
+def slowest_queries(limit=10):
+    with _lock:
+        rows = [(sql, count, total, worst) for sql, (count, total, worst) in _statements.items()]
+    return sorted(rows, key=lambda row: row[3], reverse=True)[:limit]
+
+
+# Most recent reruns, newest first
+def recent_reruns(limit=20):
+    with _lock:
+        return list(_reruns)[-limit:][::-1]
+
+
+# Most recent statements, newest first: (sql, ms, unix time)
+def recent_queries(limit=50):
+    with _lock:
+        return [tuple(entry) for entry in list(_queries)[-limit:][::-1]]
@@ -0,0 +1,241 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import date
+
+import cache
+import data
+import db
+import migrations
+import rollups
+import writer
+from benchmark import SIZES, WORDS, generate, percentile
+from import_videos import LEVELS
+
+# Relative frequency of each simulated action
+MIX = {"browse": 60, "watch": 20, "minutes": 15, "target": 5}
+
+# Attempts per action when SQLite reports the database locked or busy, and the first backoff
+MAX_ATTEMPTS = 4
+BACKOFF = 0.05
+
+
+class SimulatedUser:
+    """One learner clicking through the app's data functions.
+
+    Browsing walks the dashboard like a session would (first page, next pages,
+    searches, filters, recommendations); writes go through the same paths as
+    the pages (the background writer, or one transaction per event with
+    direct_writes).
+    """
+
+    def __init__(self, user_id, max_video_id, rng, uncached=False, direct_writes=False):
+        self.user_id = user_id
+        self.max_video_id = max_video_id
+        self.rng = rng
+        self.direct_writes = direct_writes
+        self.cursor = None
+        # With uncached=True every read goes to the database
+        self.read = (lambda fn: fn.__wrapped__) if uncached else (lambda fn: fn)
+
+    def browse(self):
+        choice = self.rng.random()
+        if choice < 0.4:
+            videos, _ = self.read(data.fetch_videos_page)(None, data.PAGE_SIZE)
+        elif choice < 0.6:
+            videos, _ = self.read(data.fetch_videos_page)(self.cursor, data.PAGE_SIZE)
+        elif choice < 0.75:
+            videos, _ = self.read(data.search_videos)(self.rng.choice(WORDS), 0, data.PAGE_SIZE)
+            return
+        elif choice < 0.9:
+            videos, _ = self.read(data.fetch_videos_page)(None, data.PAGE_SIZE, self.rng.choice(LEVELS))
+            return
+        else:
+            data.recommended_videos(self.user_id)
+            self.read(data.fetch_level_counts)()
+            return
+        self.cursor = (videos[-1][5], videos[-1][0]) if videos else None
+
+    def _progress(self, video_id, minutes, event_id=None):
+        if not self.direct_writes:
+            future = writer.submit_progress(self.user_id, video_id, date.today(), minutes, event_id)
+            return future.result(writer.RESULT_TIMEOUT)
+        with db.write_connection() as conn:
+            recorded = rollups.record_progress(conn, self.user_id, video_id, date.today(), minutes, event_id)
+        cache.bump("user_progress", self.user_id)
+        return recorded
+
+    def watch(self):
+        self._progress(self.rng.randint(1, self.max_video_id), 10)
+
+    def minutes(self):
+        self._progress(0, self.rng.randint(5, 30), uuid.uuid4().hex)
+
+    def target(self):
+        data.set_daily_target(self.user_id, self.rng.choice([15, 30, 45, 60]))
+
+
+def _is_lock_error(error):
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+
+# Run simulated users on threads in this process until the deadline; returns raw results
+def run_threads(user_ids, seconds, max_video_id, seed, uncached, direct_writes):
+    results = {"samples": {action: [] for action in MIX}, "lock_errors": 0, "retries": 0,
+               "failures": 0, "errors": 0, "error_messages": {}}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+    actions, weights = list(MIX), list(MIX.values())
+
+    def simulate(user_id):
+        rng = random.Random(seed * 100_003 + user_id)
+        user = SimulatedUser(user_id, max_video_id, rng, uncached, direct_writes)
+        samples = {action: [] for action in MIX}
+        lock_errors = retries = failures = errors = 0
+        messages = {}
+        while time.monotonic() < deadline:
+            action = rng.choices(actions, weights)[0]
+            started = time.perf_counter()
+            for attempt in range(MAX_ATTEMPTS):
+                try:
+                    getattr(user, action)()
+                    break
+                except Exception as e:
+                    if not _is_lock_error(e):
+                        errors += 1
+                        message = f"{type(e).__name__}: {e}"
+                        messages[message] = messages.get(message, 0) + 1
+                        break
+                    lock_errors += 1
+                    if attempt == MAX_ATTEMPTS - 1:
+                        failures += 1
+                    else:
+                        retries += 1
+                        time.sleep(BACKOFF * 2 ** attempt * rng.uniform(0.5, 1.5))
+            samples[action].append((time.perf_counter() - started) * 1000)
+        with lock:
+            for action, values in samples.items():
+                results["samples"][action].extend(values)
+            results["lock_errors"] += lock_errors
+            results["retries"] += retries
+            results["failures"] += failures
+            results["errors"] += errors
+            for message, count in messages.items():
+                results["error_messages"][message] = results["error_messages"].get(message, 0) + count
+
+    threads = [threading.Thread(target=simulate, args=(user_id,)) for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if not direct_writes:
+        writer.get_writer().flush()
+        results["batches"] = writer.get_writer().batches_written
+    return results
+
+
+def _process_main(args):
+    path, user_ids, seconds, max_video_id, seed, settings = args
+    db.configure(path)
+    db.READ_POOL_SIZE = settings["read_pool"]
+    writer.FLUSH_INTERVAL = settings["flush_interval"]
+    writer.MAX_BATCH = settings["max_batch"]
+    return run_threads(user_ids, seconds, max_video_id, seed, settings["uncached"], settings["direct_writes"])
+
+
+# Combine per-process results into one report
+def summarize(results_list, seconds):
+    samples = {action: [] for action in MIX}
+    totals = {"lock_errors": 0, "retries": 0, "failures": 0, "errors": 0, "batches": 0}
+    messages = {}
+    for results in results_list:
+        for message, count in results["error_messages"].items():
+            messages[message] = messages.get(message, 0) + count
+        for action, values in results["samples"].items():
+            samples[action].extend(values)
+        for key in totals:
+            totals[key] += results.get(key, 0)
+    operations = sum(len(values) for values in samples.values())
+    summary = {
+        "operations": operations,
+        "throughput": operations / seconds,
+        "actions": {action: {"count": len(values),
+                             "p50": percentile(values, 0.50), "p95": percentile(values, 0.95),
+                             "p99": percentile(values, 0.99), "max": max(values)}
+                    for action, values in samples.items() if values},
+        **totals,
+        "retry_rate": totals["retries"] / operations if operations else 0.0,
+        "error_messages": messages,
+    }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate concurrent learners against the SQLite backend.")
+    parser.add_argument("--db", help="database file (default: bench_<size>.db, generated if missing)")
+    parser.add_argument("--size", choices=sorted(SIZES), default="small")
+    parser.add_argument("--users", type=int, default=16, help="simulated concurrent users")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="split the users across this many processes (like several server processes)")
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--uncached", action="store_true", help="bypass the in-process query caches")
+    parser.add_argument("--direct-writes", action="store_true",
+                        help="one transaction per progress event instead of the batching writer")
+    parser.add_argument("--read-pool", type=int, default=db.READ_POOL_SIZE)
+    parser.add_argument("--flush-interval", type=float, default=writer.FLUSH_INTERVAL)
+    parser.add_argument("--max-batch", type=int, default=writer.MAX_BATCH)
+    parser.add_argument("--json", help="also write the summary to this JSON file")
+    args = parser.parse_args()
+
+    path = args.db or f"bench_{args.size}.db"
+    if not os.path.exists(path):
+        print(f"Generating {path} ({args.size}) ...")
+        generate(path, *SIZES[args.size])
+    db.configure(path)
+    migrations.migrate()
+    with db.read_connection() as conn:
+        max_video_id = conn.execute("SELECT MAX(id) FROM videos").fetchone()[0] or 1
+        # user_totals as well, for files generated before benchmark.py created users rows
+        existing = [row[0] for row in conn.execute("SELECT id FROM users UNION SELECT user_id FROM user_totals ORDER BY 1")]
+    db.close_all()
+
+    # Simulated users map onto existing user ids, several sessions per user if needed
+    user_ids = [existing[i % len(existing)] for i in range(args.users)]
+    settings = {"read_pool": args.read_pool, "flush_interval": args.flush_interval, "max_batch": args.max_batch,
+                "uncached": args.uncached, "direct_writes": args.direct_writes}
+    print(f"{args.users} users on {args.processes} process(es) for {args.seconds:g}s against {path} "
+          f"({'direct writes' if args.direct_writes else 'batching writer'}, "
+          f"{'uncached' if args.uncached else 'cached'} reads)")
+    groups = [user_ids[i::args.processes] for i in range(args.processes)]
+    jobs = [(path, group, args.seconds, max_video_id, args.seed + i, settings) for i, group in enumerate(groups) if group]
+    if args.processes == 1:
+        results_list = [_process_main(jobs[0])]
+    else:
+        with multiprocessing.get_context("spawn").Pool(len(jobs)) as pool:
+            results_list = pool.map(_process_main, jobs)
+    summary = summarize(results_list, args.seconds)
+
+    print(f"{summary['operations']:,} operations, {summary['throughput']:,.0f} ops/s")
+    print(f"{'action':10s}{'count':>9s}{'p50 ms':>10s}{'p95 ms':>10s}{'p99 ms':>10s}{'max ms':>10s}")
+    for action, row in summary["actions"].items():
+        print(f"{action:10s}{row['count']:9,d}{row['p50']:10.2f}{row['p95']:10.2f}{row['p99']:10.2f}{row['max']:10.2f}")
+    print(f"lock errors {summary['lock_errors']}, retries {summary['retries']} "
+          f"(rate {summary['retry_rate']:.2%}), failed after retries {summary['failures']}, "
+          f"other errors {summary['errors']}, writer batches {summary['batches']}")
+    for message, count in sorted(summary["error_messages"].items(), key=lambda item: -item[1])[:5]:
+        print(f"  {count} x {message}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import argparse
+import os
+import time
+from datetime import date, datetime, timedelta
+
+import db
+import migrations
+
+# Manual minute entries older than this many days are folded into one row per user per day
+RETENTION_DAYS = 90
+
+# Users compacted per write transaction, so the app's writer never waits long
+USERS_PER_TRANSACTION = 200
+
+# Free pages returned to the filesystem per incremental_vacuum step
+VACUUM_PAGES_PER_STEP = 1000
+
+
+# Fold manual entries (video_id 0) older than the cutoff into one row per user per day.
+# Watch events are already one row per video per day and are kept as they are; the
+# daily sums do not change, so the rollups stay valid. Returns the rows removed.
+def compact_progress(cutoff):
+    with db.read_connection() as conn:
+        users = [row[0] for row in conn.execute('''SELECT DISTINCT user_id FROM user_progress
+                                                   WHERE video_id = 0 AND watched_date < ?''', (cutoff,))]
+    removed = 0
+    for start in range(0, len(users), USERS_PER_TRANSACTION):
+        chunk = users[start:start + USERS_PER_TRANSACTION]
+        marks = ", ".join("?" * len(chunk))
+        with db.write_connection() as conn:
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM user_progress").fetchone()[0]
+            added = conn.execute(f'''INSERT INTO user_progress (user_id, video_id, watched_date, duration)
+                                     SELECT user_id, 0, watched_date, SUM(duration) FROM user_progress
+                                     WHERE video_id = 0 AND watched_date < ? AND user_id IN ({marks})
+                                     GROUP BY user_id, watched_date HAVING COUNT(*) > 1''', [cutoff] + chunk).rowcount
+            # Drop the rows the new summaries (ids above last_id) replace
+            removed += conn.execute('''DELETE FROM user_progress
+                                       WHERE video_id = 0 AND id <= ? AND (user_id, watched_date) IN
+                                       (SELECT user_id, watched_date FROM user_progress WHERE id > ?)''',
+                                    (last_id, last_id)).rowcount - added
+    return removed
+
+
+# Move every target but the latest per user into user_targets_history; returns the rows moved
+def prune_targets():
+    superseded = '''SELECT id FROM user_targets t WHERE id != (
+                        SELECT id FROM user_targets latest WHERE latest.user_id = t.user_id
+                        ORDER BY set_date DESC, id DESC LIMIT 1)'''
+    with db.write_connection() as conn:
+        conn.execute(f'''INSERT OR REPLACE INTO user_targets_history (id, user_id, target_minutes, set_date, archived_at)
+                         SELECT id, user_id, target_minutes, set_date, ? FROM user_targets WHERE id IN ({superseded})''',
+                     (datetime.now().isoformat(timespec="seconds"),))
+        return conn.execute(f"DELETE FROM user_targets WHERE id IN ({superseded})").rowcount
+
+
+# Switch an existing file to incremental auto-vacuum; this rewrites the file once with
+# VACUUM. Returns whether a conversion was needed.
+def enable_incremental_vacuum():
+    with db.write_connection(transaction=False) as conn:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    return True
+
+
+# Return free pages to the filesystem a step at a time, releasing the write lock between
+# steps; returns the pages freed
+def incremental_vacuum():
+    freed = 0
+    while True:
+        with db.write_connection(transaction=False) as conn:
+            before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if not before:
+                return freed
+            # executescript steps the pragma to completion (execute would free a single page)
+            conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES_PER_STEP});")
+            after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if after >= before:
+            return freed
+        freed += before - after
+
+
+# Database file size in bytes, including the WAL
+def file_size():
+    return sum(os.path.getsize(path) for path in (db.DB_FILE, db.DB_FILE + "-wal") if os.path.exists(path))
+
+
+# One full maintenance pass; returns a summary of what it did
+def run(retention_days=RETENTION_DAYS):
+    migrations.migrate()
+    started = time.perf_counter()
+    size_before = file_size()
+    converted = enable_incremental_vacuum()
+    cutoff = (date.today() - timedelta(days=retention_days)).isoformat()
+    summary = {
+        "converted": converted,
+        "progress_rows_removed": compact_progress(cutoff),
+        "targets_archived": prune_targets(),
+        "pages_freed": incremental_vacuum(),
+    }
+    with db.write_connection(transaction=False) as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    summary["bytes_before"] = size_before
+    summary["bytes_after"] = file_size()
+    summary["seconds"] = time.perf_counter() - started
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact old progress rows, archive old targets and reclaim free space.")
+    parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS,
+                        help="keep manual minute entries newer than this as they are")
+    parser.add_argument("--every", type=float, help="repeat every N hours instead of running once")
+    args = parser.parse_args()
+
+    while True:
+        summary = run(args.retention_days)
+        print(f"{db.DB_FILE}: {'converted to incremental auto-vacuum, ' if summary['converted'] else ''}"
+              f"{summary['progress_rows_removed']} progress rows compacted, "
+              f"{summary['targets_archived']} targets archived, {summary['pages_freed']} pages freed, "
+              f"{summary['bytes_before'] / 1e6:.1f} -> {summary['bytes_after'] / 1e6:.1f} MB "
+              f"in {summary['seconds']:.1f}s", flush=True)
+        if not args.every:
+            break
+        time.sleep(args.every * 3600)
+
+
+if __name__ == "__main__":
+    main()
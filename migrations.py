@@ -0,0 +1,260 @@
+from datetime import datetime
+
+import db
+import rollups
+import tags
+
+
+# 1: the original tables (created with IF NOT EXISTS so pre-migration databases upgrade in place)
+def _create_base_tables(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS videos
+                    (id INTEGER PRIMARY KEY, title TEXT, level TEXT, url TEXT, tags TEXT, added_date DATE)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS user_progress
+                    (id INTEGER PRIMARY KEY, user_id INTEGER, video_id INTEGER, watched_date DATE, duration INTEGER)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS user_targets
+                    (id INTEGER PRIMARY KEY, user_id INTEGER, target_minutes INTEGER, set_date DATE)''')
+
+
+# 2: covering indexes for the per-user progress, target and catalogue queries
+def _add_hot_query_indexes(conn):
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_user_progress_user_date
+                    ON user_progress (user_id, watched_date, duration)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_user_targets_user_date
+                    ON user_targets (user_id, set_date, target_minutes)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_videos_level_date
+                    ON videos (level, added_date)''')
+
+
+# 3: per-user daily and lifetime rollups, backfilled from existing progress
+def _add_progress_rollups(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS user_daily_totals
+                    (user_id INTEGER NOT NULL, day DATE NOT NULL, minutes INTEGER NOT NULL DEFAULT 0,
+                     PRIMARY KEY (user_id, day)) WITHOUT ROWID''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS user_totals
+                    (user_id INTEGER PRIMARY KEY, total_minutes INTEGER NOT NULL DEFAULT 0)''')
+    rollups.rebuild_totals(conn)
+
+
+# 4: index behind the dashboard's (added_date, id) keyset pagination
+def _add_video_pagination_index(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_added_date ON videos (added_date)")
+
+
+# 5: one row per video URL; merges existing duplicates into the oldest row first
+def _unique_video_urls(conn):
+    duplicates = conn.execute('''SELECT v.id, keep.id FROM videos v
+                                 JOIN (SELECT url, MIN(id) AS id FROM videos WHERE url IS NOT NULL
+                                       GROUP BY url HAVING COUNT(*) > 1) keep
+                                 ON v.url = keep.url AND v.id != keep.id''').fetchall()
+    conn.executemany("UPDATE user_progress SET video_id = ? WHERE video_id = ?",
+                     [(keep_id, video_id) for video_id, keep_id in duplicates])
+    conn.executemany("DELETE FROM videos WHERE id = ?", [(video_id,) for video_id, _ in duplicates])
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_videos_url ON videos (url)")
+
+
+# 6: FTS5 index over video titles and tags, kept in sync by triggers
+def _add_video_search(conn):
+    conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS videos_fts USING fts5
+                    (title, tags, content='videos', content_rowid='id',
+                     tokenize='unicode61 remove_diacritics 2', prefix='2 3')''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS videos_fts_insert AFTER INSERT ON videos BEGIN
+                        INSERT INTO videos_fts (rowid, title, tags) VALUES (new.id, new.title, new.tags);
+                    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS videos_fts_delete AFTER DELETE ON videos BEGIN
+                        INSERT INTO videos_fts (videos_fts, rowid, title, tags) VALUES ('delete', old.id, old.title, old.tags);
+                    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS videos_fts_update AFTER UPDATE OF title, tags ON videos BEGIN
+                        INSERT INTO videos_fts (videos_fts, rowid, title, tags) VALUES ('delete', old.id, old.title, old.tags);
+                        INSERT INTO videos_fts (rowid, title, tags) VALUES (new.id, new.title, new.tags);
+                    END''')
+    conn.execute("INSERT INTO videos_fts (videos_fts) VALUES ('rebuild')")
+
+
+# 7: normalised tags plus incrementally maintained level and tag facet counts
+def _normalise_tags(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS tags
+                    (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, video_count INTEGER NOT NULL DEFAULT 0)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS video_tags
+                    (video_id INTEGER NOT NULL, tag_id INTEGER NOT NULL,
+                     PRIMARY KEY (video_id, tag_id)) WITHOUT ROWID''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_video_tags_tag ON video_tags (tag_id, video_id)")
+    conn.execute('''CREATE TABLE IF NOT EXISTS level_counts
+                    (level TEXT PRIMARY KEY, video_count INTEGER NOT NULL DEFAULT 0)''')
+
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS video_tags_count_insert AFTER INSERT ON video_tags BEGIN
+                        UPDATE tags SET video_count = video_count + 1 WHERE id = new.tag_id;
+                    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS video_tags_count_delete AFTER DELETE ON video_tags BEGIN
+                        UPDATE tags SET video_count = video_count - 1 WHERE id = old.tag_id;
+                    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS level_counts_insert AFTER INSERT ON videos
+                    WHEN new.level IS NOT NULL BEGIN
+                        INSERT INTO level_counts (level, video_count) VALUES (new.level, 1)
+                        ON CONFLICT (level) DO UPDATE SET video_count = video_count + 1;
+                    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS level_counts_delete AFTER DELETE ON videos BEGIN
+                        UPDATE level_counts SET video_count = video_count - 1 WHERE level = old.level;
+                        DELETE FROM video_tags WHERE video_id = old.id;
+                    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS level_counts_update AFTER UPDATE OF level ON videos
+                    WHEN new.level IS NOT old.level BEGIN
+                        UPDATE level_counts SET video_count = video_count - 1 WHERE level = old.level;
+                        INSERT INTO level_counts (level, video_count) SELECT new.level, 1 WHERE new.level IS NOT NULL
+                        ON CONFLICT (level) DO UPDATE SET video_count = video_count + 1;
+                    END''')
+
+    # Backfill: level counts in one pass, tags from the existing comma strings in chunks
+    conn.execute('''INSERT OR REPLACE INTO level_counts (level, video_count)
+                    SELECT level, COUNT(*) FROM videos WHERE level IS NOT NULL GROUP BY level''')
+    rows = conn.execute("SELECT url, tags FROM videos WHERE url IS NOT NULL AND tags IS NOT NULL AND tags != ''")
+    while True:
+        chunk = rows.fetchmany(1000)
+        if not chunk:
+            break
+        tags.sync_tags(conn, chunk)
+
+
+# 8: one watch event per (user, video, day) plus optional client event ids; existing
+# duplicates are compacted into the first row and the rollups rebuilt to match
+def _idempotent_watch_events(conn):
+    conn.execute("ALTER TABLE user_progress ADD COLUMN event_id TEXT")
+    removed = conn.execute('''DELETE FROM user_progress WHERE video_id != 0 AND id NOT IN
+                              (SELECT MIN(id) FROM user_progress WHERE video_id != 0
+                               GROUP BY user_id, video_id, watched_date)''').rowcount
+    conn.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_user_progress_watch
+                    ON user_progress (user_id, video_id, watched_date) WHERE video_id != 0''')
+    conn.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_user_progress_event
+                    ON user_progress (event_id) WHERE event_id IS NOT NULL''')
+    if removed:
+        rollups.rebuild_totals(conn)
+
+
+# 9: superseded daily targets, moved out of user_targets by maintenance.py
+def _add_target_history(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS user_targets_history
+                    (id INTEGER PRIMARY KEY, user_id INTEGER, target_minutes INTEGER, set_date DATE,
+                     archived_at TIMESTAMP)''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_targets_history_user ON user_targets_history (user_id, set_date)")
+
+
+# 10: aggregates for the admin analytics: a covering index for per-day activity and
+# watch counts per video, kept in step with user_progress by triggers
+def _add_cohort_analytics(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_daily_totals_day ON user_daily_totals (day, minutes)")
+    conn.execute('''CREATE TABLE IF NOT EXISTS video_watch_counts
+                    (video_id INTEGER PRIMARY KEY, watches INTEGER NOT NULL DEFAULT 0)''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_video_watch_counts_watches ON video_watch_counts (watches)")
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS video_watch_counts_insert AFTER INSERT ON user_progress
+                    WHEN new.video_id != 0 BEGIN
+                        INSERT INTO video_watch_counts (video_id, watches) VALUES (new.video_id, 1)
+                        ON CONFLICT (video_id) DO UPDATE SET watches = watches + 1;
+                    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS video_watch_counts_delete AFTER DELETE ON user_progress
+                    WHEN old.video_id != 0 BEGIN
+                        UPDATE video_watch_counts SET watches = watches - 1 WHERE video_id = old.video_id;
+                    END''')
+    conn.execute('''INSERT OR REPLACE INTO video_watch_counts (video_id, watches)
+                    SELECT video_id, COUNT(*) FROM user_progress WHERE video_id != 0 GROUP BY video_id''')
+
+
+# 11: precomputed per-user video recommendations (see recommendations.py)
+def _add_recommendations(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS user_recommendations
+                    (user_id INTEGER NOT NULL, position INTEGER NOT NULL, video_id INTEGER NOT NULL,
+                     score INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (user_id, position)) WITHOUT ROWID''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS user_recommendation_state
+                    (user_id INTEGER PRIMARY KEY, level TEXT, size INTEGER NOT NULL DEFAULT 0, refreshed_on DATE)''')
+
+
+# 12: user profiles. version is bumped by triggers whenever a user's totals or targets
+# change, from any process, so sessions can tell when their cached context is stale.
+def _add_users(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS users
+                    (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, created_at TIMESTAMP,
+                     version INTEGER NOT NULL DEFAULT 0)''')
+    for table in ("user_totals", "user_targets"):
+        for event, row in (("INSERT", "new"), ("UPDATE", "new"), ("DELETE", "old")):
+            conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()} AFTER {event} ON {table} BEGIN
+                                UPDATE users SET version = version + 1 WHERE id = {row}.user_id;
+                            END''')
+    # Every user id already in use, plus user 1 (the old hardcoded user) on a fresh database
+    now = datetime.now().isoformat(timespec="seconds")
+    conn.execute('''INSERT OR IGNORE INTO users (id, name, created_at)
+                    SELECT user_id, 'User ' || user_id, ? FROM (
+                        SELECT user_id FROM user_totals UNION SELECT user_id FROM user_targets UNION SELECT 1)
+                    WHERE user_id IS NOT NULL''', (now,))
+
+
+# 13: generations of the videos and users tables, bumped by triggers on every change from
+# any process and polled by cache.py, so each process's query caches see other processes' writes
+def _add_table_generations(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS table_generations
+                    (name TEXT PRIMARY KEY, generation INTEGER NOT NULL DEFAULT 0)''')
+    conn.execute("INSERT OR IGNORE INTO table_generations (name) VALUES ('videos'), ('users')")
+    # users.version moves with every progress write, so only profile changes count
+    for table, changes in (("videos", ("INSERT", "UPDATE", "DELETE")), ("users", ("INSERT", "UPDATE OF name", "DELETE"))):
+        for change in changes:
+            conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_generation_{change.split()[0].lower()}
+                             AFTER {change} ON {table} BEGIN
+                                 UPDATE table_generations SET generation = generation + 1 WHERE name = '{table}';
+                             END''')
+
+
+# 14: videos without an added_date (the original schema allowed them) get the oldest date
+# in the catalogue, so the (added_date, id) keyset pagination can step past them
+def _backfill_video_dates(conn):
+    conn.execute('''UPDATE videos SET added_date = COALESCE((SELECT MIN(added_date) FROM videos), DATE('now', 'localtime'))
+                    WHERE added_date IS NULL''')
+
+
+# Ordered list of (version, description, function); append new migrations at the end
+MIGRATIONS = [
+    (1, "base tables", _create_base_tables),
+    (2, "indexes for per-user hot queries", _add_hot_query_indexes),
+    (3, "per-user progress rollups", _add_progress_rollups),
+    (4, "video pagination index", _add_video_pagination_index),
+    (5, "unique video URLs", _unique_video_urls),
+    (6, "full-text search over videos", _add_video_search),
+    (7, "normalised tags and facet counts", _normalise_tags),
+    (8, "idempotent watch events", _idempotent_watch_events),
+    (9, "daily target history", _add_target_history),
+    (10, "cohort analytics aggregates", _add_cohort_analytics),
+    (11, "per-user recommendations", _add_recommendations),
+    (12, "users with change versions", _add_users),
+    (13, "shared table generations", _add_table_generations),
+    (14, "dates for undated videos", _backfill_video_dates),
+]
+
+
+# Return the highest applied schema version (0 for a fresh or pre-migration database)
+def current_version(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_version
+                    (version INTEGER PRIMARY KEY, description TEXT, applied_at TIMESTAMP)''')
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+# Apply every pending migration, each in its own transaction; returns the versions applied
+def migrate():
+    applied = []
+    with db.write_connection() as conn:
+        version = current_version(conn)
+    for number, description, migration in MIGRATIONS:
+        if number <= version:
+            continue
+        with db.write_connection() as conn:
+            # Re-check inside the write lock in case another process got here first
+            if current_version(conn) >= number:
+                continue
+            migration(conn)
+            conn.execute("INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                         (number, description, datetime.now().isoformat(timespec="seconds")))
+        applied.append(number)
+    return applied
+
+
+if __name__ == "__main__":
+    versions = migrate()
+    if versions:
+        print(f"Applied migrations {', '.join(map(str, versions))} to {db.DB_FILE}")
+    else:
+        print(f"{db.DB_FILE} is up to date")
@@ -0,0 +1,42 @@
+import streamlit as st
+import calendar
+from datetime import date
+
+from data import fetch_month_totals
+
+WEEKDAY_HEADERS = ["S", "M", "T", "W", "T", "F", "S"]
+
+# Weeks start on Sunday, matching the header row
+_calendar = calendar.Calendar(firstweekday=calendar.SUNDAY)
+
+# The whole month as one HTML fragment for the .calendar grid
+def month_grid_html(year, month, totals):
+    cells = [f'<div class="calendar-day">{name}</div>' for name in WEEKDAY_HEADERS]
+    for day in _calendar.itermonthdates(year, month):
+        if day.month != month:
+            cells.append('<div class="calendar-day empty"></div>')
+            continue
+        minutes = totals.get(day.isoformat())
+        if minutes:
+            cells.append(f'<div class="calendar-day active">{day.day}<br>{minutes // 60}h {minutes % 60}m</div>')
+        else:
+            cells.append(f'<div class="calendar-day">{day.day}</div>')
+    return '<div class="calendar">' + "".join(cells) + "</div>"
+
+# Month calendar with previous/next navigation; starts on the current month
+def month_calendar(user_id):
+    today = date.today()
+    year, month = st.session_state.setdefault("calendar_month", (today.year, today.month))
+
+    prev_col, title_col, next_col = st.columns([1, 3, 1])
+    if prev_col.button("←", key="calendar-prev"):
+        st.session_state["calendar_month"] = (year - 1, 12) if month == 1 else (year, month - 1)
+        st.rerun()
+    if next_col.button("→", key="calendar-next"):
+        st.session_state["calendar_month"] = (year + 1, 1) if month == 12 else (year, month + 1)
+        st.rerun()
+    title_col.header(f"{calendar.month_name[month]} - {year}")
+
+    last_day = calendar.monthrange(year, month)[1]
+    totals = fetch_month_totals(user_id, date(year, month, 1).isoformat(), date(year, month, last_day).isoformat())
+    st.markdown(month_grid_html(year, month, totals), unsafe_allow_html=True)
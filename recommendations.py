@@ -0,0 +1,107 @@
+from datetime import date
+
+import db
+from import_videos import LEVELS
+from stats import level_index
+
+# Precomputed "Recommended for you" lists, one per user who has opened the dashboard:
+#   user_recommendations(user_id, position, video_id, score)  -- the ranked list
+#   user_recommendation_state(user_id, level, size, refreshed_on) -- what it was built with
+# Watching a video removes it from the list in the same transaction; the list is rebuilt
+# when it runs low, when the user's level moves to a different video level, or on the
+# first watch of a new day (which picks up newly added videos). A rebuild ranks on a read
+# connection and only holds the write lock to store the dozen rows; the progress writer
+# runs them on a thread of their own, off the path of progress writes.
+
+# Video level for each learner level (Levels 1-7)
+VIDEO_LEVEL_FOR = [LEVELS[0], LEVELS[0], LEVELS[1], LEVELS[1], LEVELS[2], LEVELS[2], LEVELS[3]]
+
+# Videos kept per user, and the count below which the list is rebuilt
+RECOMMENDATIONS = 12
+REFILL_BELOW = 6
+
+# Newest unwatched videos at the user's level considered when ranking
+CANDIDATES = 2000
+
+
+# Video level matching a user's lifetime input
+def video_level(conn, user_id):
+    total = conn.execute("SELECT total_minutes FROM user_totals WHERE user_id = ?", (user_id,)).fetchone()
+    return VIDEO_LEVEL_FOR[level_index((total[0] if total else 0) / 60)]
+
+
+# Rank one user's list without writing: the newest unwatched videos at their level,
+# ranked by how often they watched each of the video's tags, then by recency. Returns
+# (level, [(video_id, score)]) best first; runs on a read connection.
+def rank(conn, user_id):
+    level = video_level(conn, user_id)
+    ranked = conn.execute('''WITH affinity (tag_id, weight) AS (
+                                 SELECT vt.tag_id, COUNT(*) FROM user_progress p
+                                 JOIN video_tags vt ON vt.video_id = p.video_id
+                                 WHERE p.user_id = :user AND p.video_id != 0 GROUP BY vt.tag_id),
+                             candidates AS (
+                                 SELECT v.id, v.added_date FROM videos v
+                                 WHERE v.level = :level AND NOT EXISTS (
+                                     SELECT 1 FROM user_progress p
+                                     WHERE p.user_id = :user AND p.video_id = v.id AND p.video_id != 0)
+                                 ORDER BY v.added_date DESC, v.id DESC LIMIT :candidates),
+                             scored AS (
+                                 SELECT c.id, c.added_date, COALESCE((SELECT SUM(a.weight) FROM video_tags vt
+                                                                      JOIN affinity a ON a.tag_id = vt.tag_id
+                                                                      WHERE vt.video_id = c.id), 0) AS score
+                                 FROM candidates c)
+                             SELECT id, score FROM scored ORDER BY score DESC, added_date DESC, id DESC LIMIT :limit''',
+                          {"user": user_id, "level": level, "candidates": CANDIDATES,
+                           "limit": RECOMMENDATIONS}).fetchall()
+    return level, ranked
+
+
+# Replace one user's list with a ranking from rank(), in a short write transaction.
+# Videos the user watched since the ranking was read are left out.
+def store(conn, user_id, level, ranked):
+    conn.execute("DELETE FROM user_recommendations WHERE user_id = ?", (user_id,))
+    size = conn.executemany('''INSERT INTO user_recommendations (user_id, position, video_id, score)
+                               SELECT ?, ?, ?, ? WHERE NOT EXISTS (
+                                   SELECT 1 FROM user_progress
+                                   WHERE user_id = ? AND video_id = ? AND video_id != 0)''',
+                            [(user_id, position, video_id, score, user_id, video_id)
+                             for position, (video_id, score) in enumerate(ranked, start=1)]).rowcount
+    conn.execute('''INSERT OR REPLACE INTO user_recommendation_state (user_id, level, size, refreshed_on)
+                    VALUES (?, ?, ?, ?)''', (user_id, level, max(size, 0), date.today().isoformat()))
+
+
+# Rebuild one user's list: ranked on a reader, stored in a short write transaction
+def rebuild(user_id):
+    with db.read_connection() as conn:
+        level, ranked = rank(conn, user_id)
+    with db.write_connection() as conn:
+        store(conn, user_id, level, ranked)
+
+
+# Apply newly recorded progress events (user_id, video_id, ...) inside their transaction:
+# watched videos leave the lists. Returns the users whose lists need a rebuild.
+def on_progress(conn, events):
+    for user_id, video_id, *_ in events:
+        if video_id:
+            conn.execute("DELETE FROM user_recommendations WHERE user_id = ? AND video_id = ?", (user_id, video_id))
+    stale = set()
+    today = date.today().isoformat()
+    for user_id in {event[0] for event in events}:
+        state = conn.execute("SELECT level, size, refreshed_on FROM user_recommendation_state WHERE user_id = ?",
+                             (user_id,)).fetchone()
+        if state is None:
+            continue  # built on first use instead
+        remaining = conn.execute("SELECT COUNT(*) FROM user_recommendations WHERE user_id = ?",
+                                 (user_id,)).fetchone()[0]
+        # A list that was built short (few unwatched videos at the level) only refills
+        # on the daily or level trigger
+        running_low = remaining < REFILL_BELOW <= state[1]
+        if running_low or state[2] < today or state[0] != video_level(conn, user_id):
+            stale.add(user_id)
+    return stale
+
+
+# Drop a user's list (used together with resetting their progress)
+def clear_user(conn, user_id):
+    conn.execute("DELETE FROM user_recommendations WHERE user_id = ?", (user_id,))
+    conn.execute("DELETE FROM user_recommendation_state WHERE user_id = ?", (user_id,))
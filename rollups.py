@@ -0,0 +1,94 @@
+import argparse
+
+import db
+
+# The rollup tables are kept in step with user_progress by the helpers below,
+# always inside the same write transaction as the change to user_progress:
+#   user_daily_totals(user_id, day, minutes)  -- one row per user per active day
+#   user_totals(user_id, total_minutes)       -- running lifetime total per user
+
+
+# Add minutes to a user's daily and lifetime totals
+def add_minutes(conn, user_id, day, minutes):
+    conn.execute('''INSERT INTO user_daily_totals (user_id, day, minutes) VALUES (?, ?, ?)
+                    ON CONFLICT (user_id, day) DO UPDATE SET minutes = minutes + excluded.minutes''',
+                 (user_id, day, minutes))
+    conn.execute('''INSERT INTO user_totals (user_id, total_minutes) VALUES (?, ?)
+                    ON CONFLICT (user_id) DO UPDATE SET total_minutes = total_minutes + excluded.total_minutes''',
+                 (user_id, minutes))
+
+
+# Insert a user_progress row and roll it into the totals. A second watch of the same
+# video on the same day, or a repeated event_id, is ignored; returns whether the row
+# was new.
+def record_progress(conn, user_id, video_id, watched_date, minutes, event_id=None):
+    inserted = conn.execute('''INSERT INTO user_progress (user_id, video_id, watched_date, duration, event_id)
+                               VALUES (?, ?, ?, ?, ?) ON CONFLICT DO NOTHING''',
+                            (user_id, video_id, watched_date, minutes, event_id)).rowcount
+    if inserted:
+        add_minutes(conn, user_id, watched_date, minutes)
+    return bool(inserted)
+
+
+# Drop a user's rollups (used together with deleting their user_progress rows)
+def clear_user(conn, user_id):
+    conn.execute("DELETE FROM user_daily_totals WHERE user_id = ?", (user_id,))
+    conn.execute("DELETE FROM user_totals WHERE user_id = ?", (user_id,))
+
+
+# Regenerate the rollups from raw user_progress rows, for one user or everyone. Legacy
+# rows without a user or date (the original schema allowed them) are left out.
+def rebuild_totals(conn, user_id=None):
+    where, params = ("WHERE user_id = ?", (user_id,)) if user_id is not None else ("", ())
+    conn.execute(f"DELETE FROM user_daily_totals {where}", params)
+    conn.execute(f"DELETE FROM user_totals {where}", params)
+    only_user = "AND user_id = ?" if user_id is not None else ""
+    conn.execute(f'''INSERT INTO user_daily_totals (user_id, day, minutes)
+                     SELECT user_id, watched_date, COALESCE(SUM(duration), 0) FROM user_progress
+                     WHERE user_id IS NOT NULL AND watched_date IS NOT NULL {only_user}
+                     GROUP BY user_id, watched_date''', params)
+    conn.execute(f'''INSERT INTO user_totals (user_id, total_minutes)
+                     SELECT user_id, SUM(minutes) FROM user_daily_totals {where}
+                     GROUP BY user_id''', params)
+
+
+# Compare the rollups against raw user_progress; returns (user_id, day, rollup, raw) mismatches
+def check_totals(conn):
+    daily = conn.execute('''
+        SELECT user_id, day, SUM(rollup), SUM(raw) FROM (
+            SELECT user_id, day, minutes AS rollup, 0 AS raw FROM user_daily_totals
+            UNION ALL
+            SELECT user_id, watched_date, 0, duration FROM user_progress
+            WHERE user_id IS NOT NULL AND watched_date IS NOT NULL
+        ) GROUP BY user_id, day HAVING SUM(rollup) != SUM(raw)''').fetchall()
+    lifetime = conn.execute('''
+        SELECT user_id, NULL, SUM(rollup), SUM(raw) FROM (
+            SELECT user_id, total_minutes AS rollup, 0 AS raw FROM user_totals
+            UNION ALL
+            SELECT user_id, 0, duration FROM user_progress
+            WHERE user_id IS NOT NULL AND watched_date IS NOT NULL
+        ) GROUP BY user_id HAVING SUM(rollup) != SUM(raw)''').fetchall()
+    return daily + lifetime
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the per-user progress rollups.")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    parser.add_argument("--user-id", type=int, help="only rebuild this user's rollups")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        with db.write_connection() as conn:
+            rebuild_totals(conn, args.user_id)
+        print("Rollups rebuilt from user_progress.")
+    else:
+        with db.read_connection() as conn:
+            mismatches = check_totals(conn)
+        for user_id, day, rollup, raw in mismatches:
+            print(f"user {user_id} {day or 'lifetime'}: rollup={rollup} raw={raw}")
+        print(f"{len(mismatches)} mismatches.")
+        raise SystemExit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
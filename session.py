@@ -0,0 +1,89 @@
+import streamlit as st
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import date
+
+import cache
+import data
+import writer
+
+# The signed-in user's context lives in st.session_state["user"]: profile, daily target,
+# lifetime and today's minutes, and the users.version it was loaded at. Each rerun costs
+# one primary-key read of that version; the context is reloaded only when it moved
+# because of a write this session did not make (another session, process or the admin
+# panel), or when the day rolls over. The session's own progress is applied in place.
+
+
+def _load(user_id):
+    context = data.fetch_user_context(user_id, date.today().isoformat())
+    st.session_state["user"] = context
+    return context
+
+
+# The current session's user context (set by user_picker earlier in the rerun)
+def current_user():
+    return st.session_state["user"]
+
+
+# Sidebar user picker with a form to add a user; returns the chosen user's context
+def user_picker():
+    users = data.fetch_users()
+    names = dict(users)
+    if "new_user_id" in st.session_state:
+        st.session_state["user_id"] = st.session_state.pop("new_user_id")
+    if st.session_state.get("user_id") not in names:
+        st.session_state["user_id"] = 1 if 1 in names else users[0][0]
+    user_id = st.sidebar.selectbox("Learner", list(names), format_func=names.get, key="user_id")
+    with st.sidebar.expander("Add a learner"):
+        name = st.text_input("Name", key="new-user-name").strip()
+        if st.button("Add", key="new-user-add"):
+            new_user_id = data.create_user(name) if name and name not in names.values() else None
+            if new_user_id is None:
+                st.error("Please enter a new name.")
+            else:
+                # The picker already exists in this run, so select the new user on the next one
+                st.session_state["new_user_id"] = new_user_id
+                st.rerun()
+
+    context = st.session_state.get("user")
+    if context is None or context["id"] != user_id or context["day"] != date.today().isoformat():
+        context = _load(user_id)
+    elif data.fetch_user_version(user_id) != context["version"]:
+        # Someone else wrote this user's progress; the process caches may not know yet
+        cache.bump("user_progress", user_id)
+        cache.bump("user_targets", user_id)
+        cache.bump("user_recommendations", user_id)
+        context = _load(user_id)
+    target = f" / {context['target']}" if context["target"] else ""
+    st.sidebar.caption(f"Today: {context['today_minutes']}{target} min")
+    return context
+
+
+# Apply a write this session made: each recorded progress event bumps the version once
+def _own_progress(recorded, minutes):
+    if recorded:
+        context = current_user()
+        context["total_minutes"] += minutes
+        context["today_minutes"] += minutes
+        context["version"] += 1
+    return recorded
+
+
+# Wait for a queued write to commit; None if it did not in time. It may still land
+# later, and the version check on the next rerun picks it up then.
+def _wait(future):
+    try:
+        return future.result(writer.RESULT_TIMEOUT)
+    except FutureTimeoutError:  # not the builtin TimeoutError before Python 3.11
+        st.error("Saving is taking longer than usual. Please check again in a moment.")
+        return None
+
+
+# Log minutes for the current user; returns whether they were recorded (None on a timeout)
+def log_minutes(minutes, event_id=None):
+    return _own_progress(_wait(data.update_minutes_spent(current_user()["id"], minutes, event_id)), minutes)
+
+
+# Mark a video as watched by the current user; returns False if it already was today
+# (None on a timeout)
+def mark_watched(video_id, minutes=10):
+    return _own_progress(_wait(data.mark_video_watched(current_user()["id"], video_id, minutes)), minutes)
@@ -0,0 +1,79 @@
+import bisect
+from datetime import date, timedelta
+
+import cache
+import db
+
+# Learner levels by cumulative hours of input
+LEARNER_LEVELS = [
+    {"level": "Level 1", "description": "Starting from zero.", "hours": 0, "known_words": 0},
+    {"level": "Level 2", "description": "You know some common words.", "hours": 50, "known_words": 300},
+    {"level": "Level 3", "description": "You can follow topics that are adapted for learners.", "hours": 150, "known_words": 1500},
+    {"level": "Level 4", "description": "You can understand a person speaking to you patiently.", "hours": 300, "known_words": 3000},
+    {"level": "Level 5", "description": "You can understand native speakers speaking to you normally.", "hours": 600, "known_words": 5000},
+    {"level": "Level 6", "description": "You are comfortable with daily conversation.", "hours": 1000, "known_words": 7000},
+    {"level": "Level 7", "description": "You can use the language effectively for all practical purposes.", "hours": 1500, "known_words": 12000}
+]
+LEVEL_HOURS = [level["hours"] for level in LEARNER_LEVELS]
+
+
+# Index into LEARNER_LEVELS of the level reached with the given hours
+def level_index(hours):
+    return max(bisect.bisect_right(LEVEL_HOURS, hours) - 1, 0)
+
+
+# Streaks, rolling averages and level from a user's (day, minutes) totals, sorted by day.
+# A streak is still current if the last practice day was today or yesterday.
+def compute_stats(daily_totals, today):
+    week_start = today - timedelta(days=6)
+    month_start = today - timedelta(days=29)
+    total = week = month = 0
+    longest = run = 0
+    previous = None
+    for day, minutes in daily_totals:
+        if not minutes or minutes <= 0:
+            continue
+        day = date.fromisoformat(day) if isinstance(day, str) else day
+        total += minutes
+        if day >= month_start:
+            month += minutes
+            if day >= week_start:
+                week += minutes
+        run = run + 1 if previous is not None and day - previous == timedelta(days=1) else 1
+        longest = max(longest, run)
+        previous = day
+    current = run if previous is not None and today - previous <= timedelta(days=1) else 0
+
+    hours = total / 60
+    index = level_index(hours)
+    return {
+        "total_minutes": total,
+        "current_streak": current,
+        "longest_streak": longest,
+        "avg_7_day": week / 7,
+        "avg_30_day": month / 30,
+        "level_index": index,
+        "level": LEARNER_LEVELS[index],
+        "next_level": LEARNER_LEVELS[index + 1] if index + 1 < len(LEARNER_LEVELS) else None,
+    }
+
+
+# Days until the next level at the user's recent pace (30-day average, falling back to
+# the 7-day average and then the daily target); None without any pace to go on
+def days_to_next_level(stats, daily_target=None):
+    if stats["next_level"] is None:
+        return None
+    pace = stats["avg_30_day"] or stats["avg_7_day"] or daily_target
+    if not pace:
+        return None
+    remaining = stats["next_level"]["hours"] * 60 - stats["total_minutes"]
+    return max(remaining / pace, 0)
+
+
+# Stats for one user, memoised until that user's progress changes (or the day rolls over)
+@cache.cached("user_progress", user_scoped=True)
+def user_stats(user_id, today):
+    with db.read_connection() as conn:
+        daily_totals = conn.execute("SELECT day, minutes FROM user_daily_totals WHERE user_id = ? ORDER BY day",
+                                    (user_id,)).fetchall()
+    return compute_stats(daily_totals, today)
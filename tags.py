@@ -0,0 +1,32 @@
+import re
+
+# Tags live in tags(id, name, video_count) and video_tags(video_id, tag_id); the
+# comma-separated videos.tags column is kept for display and full-text search.
+# tags.video_count and level_counts(level, video_count) are facet counts kept
+# current by triggers on videos and video_tags (see migration 7).
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+# Split a comma-separated tag string into unique, normalised tag names
+def split_tags(text):
+    names = []
+    for part in (text or "").split(","):
+        name = _WHITESPACE.sub(" ", part).strip().lower()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+# Make video_tags match the tag strings of the given videos, identified by URL.
+# Works on whole batches with executemany so bulk imports stay set-based. A URL that
+# appears more than once keeps its last tag string, as the upsert into videos does.
+def sync_tags(conn, videos):
+    videos = list(dict(videos).items())
+    pairs = [(url, name) for url, text in videos for name in split_tags(text)]
+    conn.executemany("INSERT OR IGNORE INTO tags (name) VALUES (?)",
+                     [(name,) for name in {name for _, name in pairs}])
+    conn.executemany("DELETE FROM video_tags WHERE video_id = (SELECT id FROM videos WHERE url = ?)",
+                     [(url,) for url, _ in videos])
+    conn.executemany('''INSERT OR IGNORE INTO video_tags (video_id, tag_id)
+                        SELECT v.id, t.id FROM videos v, tags t WHERE v.url = ? AND t.name = ?''', pairs)
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import migrations  # noqa: E402
+
+
+# A migrated database file of its own for each test
+@pytest.fixture
+def database(tmp_path):
+    db.configure(str(tmp_path / "test.db"))
+    migrations.migrate()
+    yield db
+    db.close_all()
@@ -0,0 +1,198 @@
+import threading
+import time
+from datetime import date
+
+import pytest
+
+import db
+import rollups
+import writer
+
+TODAY = date.today().isoformat()
+
+
+@pytest.fixture
+def progress_writer(database):
+    # A long flush interval so events submitted together land in one batch
+    progress_writer = writer.ProgressWriter(flush_interval=0.2, max_batch=50)
+    yield progress_writer
+    progress_writer.close(timeout=5)
+
+
+def progress_rows():
+    with db.read_connection() as conn:
+        return conn.execute("SELECT user_id, video_id, duration FROM user_progress ORDER BY id").fetchall()
+
+
+def total_minutes(user_id):
+    with db.read_connection() as conn:
+        row = conn.execute("SELECT total_minutes FROM user_totals WHERE user_id = ?", (user_id,)).fetchone()
+    return row[0] if row else 0
+
+
+def assert_rollups_match():
+    with db.read_connection() as conn:
+        assert rollups.check_totals(conn) == []
+
+
+def test_events_submitted_together_are_written_in_one_batch(progress_writer):
+    futures = [progress_writer.submit(1, video_id, TODAY, 10) for video_id in range(1, 11)]
+    assert [future.result(5) for future in futures] == [True] * 10
+    assert progress_writer.batches_written == 1
+    assert progress_writer.events_written == 10
+    assert total_minutes(1) == 100
+    assert_rollups_match()
+
+
+def test_batches_are_capped_at_max_batch(database):
+    progress_writer = writer.ProgressWriter(flush_interval=0.2, max_batch=4)
+    try:
+        futures = [progress_writer.submit(1, video_id, TODAY, 10) for video_id in range(1, 11)]
+        assert all(future.result(5) for future in futures)
+        assert progress_writer.batches_written == 3
+    finally:
+        progress_writer.close(timeout=5)
+
+
+def test_duplicate_watches_and_event_ids_are_recorded_once(progress_writer):
+    futures = [
+        progress_writer.submit(1, 7, TODAY, 10),
+        progress_writer.submit(1, 7, TODAY, 10),
+        progress_writer.submit(1, 0, TODAY, 15, "entry-1"),
+        progress_writer.submit(1, 0, TODAY, 15, "entry-1"),
+    ]
+    assert [future.result(5) for future in futures] == [True, False, True, False]
+    assert progress_writer.submit(1, 0, TODAY, 15, "entry-1").result(5) is False
+    assert progress_rows() == [(1, 7, 10), (1, 0, 15)]
+    assert total_minutes(1) == 25
+    assert_rollups_match()
+
+
+def test_a_bad_event_fails_alone_and_the_rest_of_its_batch_is_written(progress_writer):
+    good = progress_writer.submit(1, 1, TODAY, 10)
+    bad = progress_writer.submit(None, 2, TODAY, 10)  # rejected by the rollups' NOT NULL user_id
+    other = progress_writer.submit(2, 3, TODAY, 10)
+    assert good.result(5) is True
+    assert other.result(5) is True
+    with pytest.raises(Exception):
+        bad.result(5)
+    assert progress_rows() == [(1, 1, 10), (2, 3, 10)]
+    assert_rollups_match()
+
+
+def test_a_failure_after_commit_does_not_replay_the_batch(progress_writer, monkeypatch):
+    def fail(*args):
+        raise RuntimeError("cache unavailable")
+
+    monkeypatch.setattr(writer.cache, "bump", fail)
+    future = progress_writer.submit(1, 0, TODAY, 15)
+    assert future.result(5) is True
+    progress_writer.flush(5)
+    assert progress_rows() == [(1, 0, 15)]
+    assert total_minutes(1) == 15
+
+
+def test_the_thread_survives_an_unexpected_error(progress_writer, monkeypatch):
+    def fail(batch):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(progress_writer, "_write", fail)
+    with pytest.raises(RuntimeError, match="boom"):
+        progress_writer.submit(1, 1, TODAY, 10).result(5)
+    monkeypatch.undo()
+    assert progress_writer.alive
+    assert progress_writer.submit(1, 1, TODAY, 10).result(5) is True
+
+
+def test_flush_waits_for_everything_submitted_before_it(progress_writer):
+    futures = [progress_writer.submit(user_id, 1, TODAY, 10) for user_id in range(1, 6)]
+    progress_writer.flush(5)
+    assert all(future.done() for future in futures)
+    assert len(progress_rows()) == 5
+
+
+def test_close_writes_pending_events_and_later_submits_fail_fast(progress_writer):
+    future = progress_writer.submit(1, 1, TODAY, 10)
+    progress_writer.close(timeout=5)
+    assert future.result(0) is True
+    assert not progress_writer.alive
+    with pytest.raises(RuntimeError):
+        progress_writer.submit(1, 2, TODAY, 10)
+    with pytest.raises(RuntimeError):
+        progress_writer.flush(1)
+
+
+def test_concurrent_submitters_all_get_their_results(progress_writer):
+    results = {}
+
+    def submit(user_id):
+        results[user_id] = [progress_writer.submit(user_id, video_id, TODAY, 10).result(5) for video_id in range(1, 6)]
+
+    threads = [threading.Thread(target=submit, args=(user_id,)) for user_id in range(1, 9)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {user_id: [True] * 5 for user_id in range(1, 9)}
+    assert_rollups_match()
+
+
+def test_get_writer_replaces_a_stopped_writer(database):
+    first = writer.get_writer()
+    first.close(timeout=5)
+    second = writer.get_writer()
+    try:
+        assert second is not first and second.alive
+        assert second.submit(1, 1, TODAY, 10).result(5) is True
+    finally:
+        writer.shutdown()
+
+
+def mark_list_stale(user_id):
+    # A list built yesterday is rebuilt on the user's first progress event of the day
+    with db.write_connection() as conn:
+        conn.execute("INSERT INTO user_recommendation_state (user_id, level, size, refreshed_on) VALUES (?, ?, ?, ?)",
+                     (user_id, "Superbeginner", 0, "2000-01-01"))
+
+
+def refreshed_on(user_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with db.read_connection() as conn:
+            day = conn.execute("SELECT refreshed_on FROM user_recommendation_state WHERE user_id = ?",
+                               (user_id,)).fetchone()[0]
+        if day != "2000-01-01":
+            return day
+        time.sleep(0.01)
+    return None
+
+
+def test_stale_recommendations_are_rebuilt_off_the_writer_thread(progress_writer, monkeypatch):
+    rebuilt_on = []
+    rebuild = writer.recommendations.rebuild
+
+    def record_thread(user_id):
+        rebuilt_on.append(threading.current_thread().name)
+        rebuild(user_id)
+
+    monkeypatch.setattr(writer.recommendations, "rebuild", record_thread)
+    mark_list_stale(1)
+    assert progress_writer.submit(1, 0, TODAY, 15).result(5) is True
+    assert refreshed_on(1) == TODAY
+    assert rebuilt_on == ["recommendation-refresher"]
+
+
+def test_a_failed_rebuild_is_skipped_without_replaying_progress(progress_writer, monkeypatch):
+    def fail(user_id):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(writer.recommendations, "rebuild", fail)
+    mark_list_stale(1)
+    assert progress_writer.submit(1, 0, TODAY, 15).result(5) is True
+    progress_writer.flush(5)
+    time.sleep(0.1)
+    assert progress_rows() == [(1, 0, 15)]
+    assert total_minutes(1) == 15
+    assert progress_writer.alive
+    assert progress_writer.submit(1, 0, TODAY, 5).result(5) is True
+    assert total_minutes(1) == 20
@@ -0,0 +1,228 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+
+import cache
+import db
+import recommendations
+import rollups
+
+# A batch is written once it has MAX_BATCH events or its first event is FLUSH_INTERVAL seconds old
+FLUSH_INTERVAL = 0.005
+MAX_BATCH = 200
+
+# How long callers wait on a submitted event (or a flush) before giving up, in seconds
+RESULT_TIMEOUT = 30
+
+_STOP = object()
+
+log = logging.getLogger(__name__)
+
+
+# Resolve a future unless it already is (a committed event, or one the caller cancelled)
+def _resolve(future, result=None, error=None):
+    if future.done():
+        return
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+class ProgressWriter:
+    """Background thread that writes progress events in batched transactions.
+
+    Streamlit sessions submit user_progress rows here instead of committing them
+    one by one; the thread groups whatever is pending into a single write
+    transaction. submit() returns a Future that resolves once the event is
+    committed (and the caches are bumped), for callers that need to read their
+    own write. Every future is resolved exactly once: with the result, with the
+    error that stopped its event, or with a RuntimeError once the writer is closed.
+    """
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, max_batch=MAX_BATCH):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.batches_written = 0
+        self.events_written = 0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="progress-writer", daemon=True)
+        self._thread.start()
+        # Stale recommendation lists are rebuilt on a second thread, so a rebuild never
+        # delays the progress events queued behind it
+        self._stale = queue.Queue()
+        self._stale_pending = set()
+        self._refresher = threading.Thread(target=self._refresh_lists, name="recommendation-refresher", daemon=True)
+        self._refresher.start()
+
+    @property
+    def alive(self):
+        return not self._closed and self._thread.is_alive()
+
+    def _put(self, future, event):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("the progress writer is not running")
+            self._queue.put((future, event))
+        return future
+
+    # Queue one user_progress row; returns a Future that resolves to whether the row was
+    # new (False for a duplicate watch or a repeated event_id). Raises RuntimeError if
+    # the writer has been closed.
+    def submit(self, user_id, video_id, watched_date, minutes, event_id=None):
+        return self._put(Future(), (user_id, video_id, watched_date, minutes, event_id))
+
+    # Block until everything submitted so far is committed
+    def flush(self, timeout=None):
+        self._put(Future(), None).result(timeout)
+
+    # Write what is pending and stop the thread
+    def close(self, timeout=None):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._stale.put(_STOP)
+        self._refresher.join(timeout)
+
+    def _run(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    return
+                batch = [item]
+                deadline = time.monotonic() + self.flush_interval
+                stop = False
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                        break
+                    batch.append(item)
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    # One bad batch must not take the thread down; fail what it left pending
+                    for future, _ in batch:
+                        _resolve(future, error=e)
+                if stop:
+                    return
+        finally:
+            # No new events after this; fail anything still queued instead of leaving it pending
+            with self._lock:
+                self._closed = True
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _STOP:
+                    _resolve(item[0], error=RuntimeError("the progress writer stopped"))
+
+    def _write(self, batch):
+        events = [(future, event) for future, event in batch if event is not None]
+        stale = set()
+        if events:
+            try:
+                stale = self._commit(events)
+            except Exception:
+                # Retry one by one so a single bad event does not fail the whole batch.
+                # Events whose futures are resolved were committed and are never replayed.
+                for future, event in events:
+                    if future.done():
+                        continue
+                    try:
+                        stale |= self._commit([(future, event)])
+                    except Exception as e:
+                        _resolve(future, error=e)
+        for future, event in batch:
+            if event is None:
+                _resolve(future)
+        self._schedule_refresh(stale)
+
+    # Write events in one transaction; returns the users whose recommendation lists went stale
+    def _commit(self, events):
+        with db.write_connection() as conn:
+            recorded = [rollups.record_progress(conn, *event) for _, event in events]
+            new_events = [event for (_, event), new in zip(events, recorded) if new]
+            stale = recommendations.on_progress(conn, new_events)
+        # Committed: resolve the futures before anything else can fail
+        for (future, _), new in zip(events, recorded):
+            _resolve(future, new)
+        self.batches_written += 1
+        self.events_written += len(new_events)
+        for user_id in {event[0] for event in new_events}:
+            cache.bump("user_progress", user_id)
+            cache.bump("user_recommendations", user_id)
+        return stale
+
+    def _schedule_refresh(self, user_ids):
+        for user_id in user_ids:
+            with self._lock:
+                if user_id in self._stale_pending:
+                    continue
+                self._stale_pending.add(user_id)
+            self._stale.put(user_id)
+
+    def _refresh_lists(self):
+        while True:
+            user_id = self._stale.get()
+            if user_id is _STOP:
+                return
+            with self._lock:
+                self._stale_pending.discard(user_id)
+            try:
+                recommendations.rebuild(user_id)
+                cache.bump("user_recommendations", user_id)
+            except Exception:
+                # The list stays as it is and is rebuilt on a later trigger
+                log.exception("Rebuilding recommendations for user %s failed; skipped", user_id)
+
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+# The process-wide writer, started on first use (and again after a fork, or if its
+# thread has stopped)
+def get_writer():
+    global _writer, _writer_pid
+    if _writer is None or _writer_pid != os.getpid() or not _writer.alive:
+        with _writer_lock:
+            if _writer is None or _writer_pid != os.getpid() or not _writer.alive:
+                _writer = ProgressWriter(FLUSH_INTERVAL, MAX_BATCH)
+                _writer_pid = os.getpid()
+    return _writer
+
+
+# Flush and stop this process's writer (registered to run at interpreter exit)
+def shutdown():
+    global _writer
+    with _writer_lock:
+        if _writer is not None and _writer_pid == os.getpid():
+            _writer.close()
+        _writer = None
+
+
+atexit.register(shutdown)
+
+
+def submit_progress(user_id, video_id, watched_date, minutes, event_id=None):
+    return get_writer().submit(user_id, video_id, watched_date, minutes, event_id)